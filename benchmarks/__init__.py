@@ -0,0 +1,8 @@
+'''
+Benchmarks of the metadata loaders and plotters on synthetic detector trees
+
+    python -m benchmarks.run --sizes 100 1000 10000 --out results.json
+    python -m benchmarks.run --compare baseline.json results.json
+
+synthetic.py generates the trees (old and new json format), run.py times the functions and saves the results as json.
+'''
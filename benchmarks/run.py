@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import contextlib
+from datetime import datetime
+
+import matplotlib
+matplotlib.use('Agg') # no display needed
+import matplotlib.pyplot as plt
+
+import info_table
+import old_to_new_format
+from param_vs_det import params_vs_det
+from det_pie import det_pie
+from benchmarks.synthetic import make_tree
+
+# -------------------------------------------------------------------------------
+
+# parameters read in get_params / info_table benchmarks
+PARAMS = ['mass', 'fwhm_Qbb', 'depV', 'man', 'date']
+
+# -------------------------------------------------------------------------------
+
+def run(sizes=[100, 1000], repeat=3, workdir=None, missing_rate=0.05):
+    '''
+    (list, int, string, float) -> dict
+
+    Generate synthetic trees of given sizes and time the loaders, the migration and the plots end to end;
+    return results as dict (best of repeat runs per function)
+
+    sizes [list]: numbers of detectors, e.g. [100, 1000, 10000, 100000]
+    repeat [int]: number of runs per function
+    workdir [string]: folder for trees and outputs (default temporary, removed at the end)
+    missing_rate [float]: fraction of missing fields in the trees
+    '''
+    tmp = workdir is None
+    if tmp: workdir = tempfile.mkdtemp(prefix='detector_info_bench_')
+    cwd = os.getcwd()
+
+    results = []
+    try:
+        for n in sizes:
+            new_path = os.path.join(workdir, 'new_{}'.format(n), '')
+            old_path = os.path.join(workdir, 'old_{}'.format(n), '')
+            out_path = os.path.join(workdir, 'out_{}'.format(n), '')
+            make_tree(new_path, n, 'new', missing_rate)
+            make_tree(old_path, n, 'old', missing_rate)
+            for sub in ['detectors', 'crystals', 'plots']:
+                os.makedirs(os.path.join(out_path, sub), exist_ok=True)
+            # plots are written to the working directory
+            os.chdir(out_path)
+
+            det_list = info_table.detector_list(new_path, 10000, ['B','C','P','V'])
+            funcs = {
+                'detector_list': lambda: info_table.detector_list(new_path, 10000, ['B','C','P','V']),
+                'get_params': lambda: info_table.get_params(det_list, PARAMS, new_path),
+                'info_table': lambda: info_table.info_table(PARAMS, new_path),
+                # force: later runs would only check the manifest of the first one (see parse_old_to_new())
+                'parse_old_to_new': lambda: old_to_new_format.parse_old_to_new(old_path, out_path, force=True),
+                'crystal_json': lambda: old_to_new_format.crystal_json(old_path, out_path),
+                'params_vs_det': lambda: params_vs_det(['mass'], ['V'], metadata_path=new_path),
+                'det_pie': lambda: det_pie(new_path),
+            }
+            for name, func in funcs.items():
+                times = [timed(func) for _ in range(repeat)]
+                results.append({'size': n, 'function': name, 'time_s': min(times), 'times_s': times})
+                print('{:>8} {:<18} {:.4f} s'.format(n, name, min(times)))
+    finally:
+        os.chdir(cwd)
+        if tmp: shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+
+
+def timed(func):
+    '''
+    (function) -> float
+
+    Run func once from a cold state (in-process catalogs and indices dropped, figures closed), return wall time in s
+    '''
+    info_table.CATALOGS.clear()
+    info_table.INDICES.clear()
+    plt.close('all')
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+
+def compare(baseline, new):
+    '''
+    (string, string) -> None
+
+    Print times of two result files side by side with the ratio new/baseline
+
+    baseline [string]: path to results json of the reference run
+    new [string]: path to results json to compare
+    '''
+    res = []
+    for fname in [baseline, new]:
+        with open(fname) as f:
+            res.append({(r['size'], r['function']): r['time_s'] for r in json.load(f)['results']})
+
+    print('{:>8} {:<18} {:>10} {:>10} {:>7}'.format('size', 'function', 'baseline', 'new', 'ratio'))
+    for key in res[0]:
+        if key not in res[1]: continue
+        print('{:>8} {:<18} {:>10.4f} {:>10.4f} {:>7.2f}'.format(key[0], key[1], res[0][key], res[1][key], res[1][key] / res[0][key]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark detector_info on synthetic metadata trees')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000], help='numbers of detectors (up to 100000)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per function (best is reported)')
+    parser.add_argument('--missing-rate', type=float, default=0.05, help='fraction of missing fields')
+    parser.add_argument('--workdir', default=None, help='keep trees and outputs in this folder')
+    parser.add_argument('--out', default='bench_results.json', help='output json file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'NEW'), help='compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+
+    res = run(args.sizes, args.repeat, args.workdir, args.missing_rate)
+    with open(args.out, 'w') as f:
+        json.dump(res, f, indent=2)
+    print('Results saved to {}'.format(args.out))
@@ -0,0 +1,203 @@
+import os
+import json
+import random
+
+from info_table import JSON_FIELDS
+
+# -------------------------------------------------------------------------------
+
+# relative number of detectors per type
+TYPE_WEIGHTS = {'V': 0.5, 'B': 0.2, 'P': 0.2, 'C': 0.1}
+# ICPC orders existing in the fleet (order 0 = GERDA)
+ICPC_ORDERS = [0, 1, 2, 4, 5, 6, 7, 8, 9, 10]
+# slice letters; a crystal gets a run of 1-4 consecutive slices
+SLICES = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# GERDA Coax names have other crystal codes and numbered slices (e.g. C000RG1, C00ANG3)
+COAX_CODES = ['0RG', 'ANG', 'GTF']
+COAX_SLICES = '123456789'
+# number of distinct names: crystal codes 000-999 per type and order, times slices, plus the Coax ones
+MAX_DETECTORS = sum(len(ICPC_ORDERS) if t == 'V' else 1 for t in TYPE_WEIGHTS) * 1000 * len(SLICES) + len(COAX_CODES) * len(COAX_SLICES)
+
+MANUFACTURERS = ['Mirion', 'Ortec']
+
+# values for JSON_FIELDS (new format), as (min, max) for random floats or list of choices
+NEW_VALUES = {
+    'mass': (500., 4000.),
+    'radius': (30., 45.),
+    'height': (30., 90.),
+    'depV': (1500., 4500.),
+    'depV_man': (1500., 4500.),
+    'recV_man': (2500., 5000.),
+    'fwhm_Qbb': (2.0, 3.0),
+    'fwhm_Co60': (1.8, 2.5),
+    'fwhm_Co60_man': (1.8, 2.5),
+    'fwhm_TlFEP': (2.0, 3.0),
+    'sf_TlDEP': (0.85, 0.95),
+    'sf_Qbb': (0.4, 0.6),
+    'sf_TlSEP': (0.05, 0.15),
+    'sf_TlFEP': (0.05, 0.15),
+    'dl_man': (0.5, 1.5),
+    'daq': ['struck', 'flashcam'],
+    'enr': (86., 92.),
+    'repr': [True, False],
+    'man': MANUFACTURERS,
+    'top_taper_angle': (0., 45.),
+    'top_taper_height': (0., 5.),
+    'bottom_taper_angle': (0., 45.),
+    'bottom_taper_height': (0., 5.),
+    'bull': (0., 3.),
+}
+
+# -------------------------------------------------------------------------------
+
+def make_tree(path, n_det, schema='new', missing_rate=0.05, seed=0):
+    '''
+    (string, int, string, float, int) -> list
+
+    Write n_det synthetic detector jsons to given folder and return their names
+
+    path [string]: output folder (created if needed)
+    n_det [int]: number of detectors
+    schema [string]: 'new' (paths from JSON_FIELDS) or 'old' (input format of parse_old_to_new())
+    missing_rate [float]: fraction of optional fields left out (new) or set to 0/missing (old)
+    seed [int]: random seed, same seed gives the same tree
+    '''
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+
+    names = det_names(n_det, rng)
+    for name in names:
+        js = new_detector(name, rng, missing_rate) if schema == 'new' else old_detector(name, rng, missing_rate)
+        with open(os.path.join(path, name + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(js, f, ensure_ascii=False, indent=2)
+
+    return names
+
+
+def det_names(n_det, rng):
+    '''
+    (int, random.Random) -> list
+
+    Return n_det unique detector names (type, order, crystal code, slice); slices of a crystal share type and order.
+    Raise ValueError if n_det exceeds MAX_DETECTORS
+    '''
+    if n_det > MAX_DETECTORS:
+        raise ValueError('At most {} synthetic detector names, {} requested'.format(MAX_DETECTORS, n_det))
+    types = list(TYPE_WEIGHTS)
+    weights = [TYPE_WEIGHTS[t] for t in types]
+    names = set()
+    while len(names) < n_det:
+        t = rng.choices(types, weights)[0]
+        order = rng.choice(ICPC_ORDERS) if t == 'V' else 0
+        if t == 'C' and rng.random() < 0.5:
+            # GERDA Coax
+            crystal, slices = rng.choice(COAX_CODES), COAX_SLICES
+        else:
+            crystal, slices = '{:03d}'.format(rng.randrange(1000)), SLICES
+        # a few slices per crystal
+        first = rng.randrange(len(slices))
+        for s in slices[first:first+rng.randint(1, 4)]:
+            names.add('{}{:02d}{}{}'.format(t, order, crystal, s))
+
+    return sorted(names)[:n_det]
+
+
+def new_detector(name, rng, missing_rate):
+    '''
+    (string, random.Random, float) -> dict
+
+    Return synthetic detector metadata in the new format, fields at the paths defined in JSON_FIELDS
+    '''
+    js = {'name': name, 'production': {}, 'geometry': {}, 'characterization': {}}
+    js['production']['order'] = int(name[1:3])
+    js['production']['crystal'] = name[3:6]
+    js['production']['slice'] = name[6:]
+    js['production']['serialno'] = name[3:]
+
+    for p, path in JSON_FIELDS.items():
+        # name-derived fields and mass are always there, missing values are null as in migrated jsons
+        if p not in ['mass', 'man', 'cry', 'serialno', 'date'] and rng.random() < missing_rate:
+            val = None
+        elif p == 'cry':
+            val = name[3:6]
+        elif p == 'serialno':
+            val = name[3:]
+        elif p == 'date':
+            val = '20{:02d}-{:02d}-{:02d}'.format(rng.randint(15, 23), rng.randint(1, 12), rng.randint(1, 28))
+        else:
+            val = random_value(NEW_VALUES[p], rng)
+        node = js
+        for f in path[:-1]:
+            node = node.setdefault(f, {})
+        node[path[-1]] = val
+
+    return js
+
+
+def old_detector(name, rng, missing_rate):
+    '''
+    (string, random.Random, float) -> dict
+
+    Return synthetic detector metadata in the old format, as read by parse_old_to_new():
+    mass and dead layer under geometry, DD-MM-YYYY dates, 0 for missing values
+    '''
+    def value(rng_range, optional=True):
+        if optional and rng.random() < missing_rate: return 0
+        return random_value(rng_range, rng)
+
+    js = {}
+    js['det_name'] = name
+    js['production'] = {
+        'manufacturer': rng.choice(MANUFACTURERS),
+        'order': int(name[1:3]),
+        'serialno': name[3:],
+        'crystal': name[3:6],
+        'slice': name[6:],
+        'enrichment': value(NEW_VALUES['enr']),
+        'reprocessing': rng.choice([True, False]),
+        'delivered': '' if rng.random() < missing_rate else '{:02d}-{:02d}-20{:02d}'.format(rng.randint(1, 28), rng.randint(1, 12), rng.randint(15, 23)),
+        'dep_voltage_in_V': value(NEW_VALUES['depV']),
+        'rec_voltage_in_V': value(NEW_VALUES['recV_man']),
+    }
+    js['geometry'] = {
+        'mass_in_g': value(NEW_VALUES['mass'], False),
+        'height_in_mm': value(NEW_VALUES['height'], False),
+        'radius_in_mm': value(NEW_VALUES['radius'], False),
+        'bottom_cyl': {'radius_in_mm': value(NEW_VALUES['radius']), 'height_in_mm': value((0., 10.))},
+        'taper': {
+            'top': {'angle_in_deg': value(NEW_VALUES['top_taper_angle']), 'height_in_mm': value(NEW_VALUES['top_taper_height'])},
+            'bottom': {'angle_in_deg': value(NEW_VALUES['bottom_taper_angle']), 'height_in_mm': value(NEW_VALUES['bottom_taper_height'])},
+        },
+    }
+    # some detectors have no dead layer field, BEGes have non-zero ones
+    if rng.random() >= missing_rate:
+        js['geometry']['dl_thickness_in_mm'] = value(NEW_VALUES['dl_man']) if name[0] == 'B' else 0
+
+    js['characterization'] = {
+        'manufacturer': {
+            'dep_voltage_in_V': value(NEW_VALUES['depV_man']),
+            # recommended voltage is required by parse_old_to_new()
+            'op_voltage_in_V': value(NEW_VALUES['recV_man'], False),
+            '57co_fep_res_in_keV': value((0.8, 1.2)),
+            '60co_fep_res_in_keV': value(NEW_VALUES['fwhm_Co60_man']),
+        },
+        'l200_site': {
+            'data': '/data/{}'.format(name),
+            'elog': 'https://elog/{}'.format(name),
+            'res': {},
+            'sf': {src: value(NEW_VALUES['sf_Qbb']) for src in ['tldep_in_pc', 'qbb_in_pc', 'tlsep_in_pc', 'tlfep_in_pc']},
+        },
+    }
+    # some detectors have missing FWHM entries
+    for src in ['cofep_in_keV', 'tlfep_in_keV', 'qbb_in_keV']:
+        if rng.random() >= missing_rate:
+            js['characterization']['l200_site']['res'][src] = value(NEW_VALUES['fwhm_Qbb'], False)
+
+    return js
+
+
+def random_value(spec, rng):
+    ''' Random float rounded to 0.1 in (min, max), or random choice from a list '''
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    return round(rng.uniform(*spec), 1)
@@ -1,7 +1,5 @@
-import matplotlib.pyplot as plt
-# increase all font sizes
-plt.rcParams.update({'font.size': 10})
 from info_table import *
+import profiling
 
 # -------------------------------------------------------------------------------
 
@@ -24,10 +22,12 @@ LABELS = {
 
 # -------------------------------------------------------------------------------
 
-def det_pie():
+def det_pie(metadata_path=METADATA_PATH):
     '''
     Plot a pie chart of current status of L200 detector production
 
+    metadata_path [string]: path to folder with detector metadata jsons
+
     >>> det_pie()
     total number of detectors: XXX
     total mass: XXX
@@ -52,59 +52,86 @@ def det_pie():
     PPC (MJD)        XX  #ff7f0e     PPC (MJD)\nN detectors\nXXkg
     Saving as plots/L200_detector_pie.pdf
     '''
-    ## 1. Read table
-    df = info_table(['mass'], det_type='all')
-
-    print('total number of detectors: {}'.format(len(df)))
-    print('total mass: {}'.format(df['mass'].sum()))
+    ## 1. Summary per category
+    dfpie = fleet_summary(metadata_path)
+    fleet = dfpie.drop('ICPC (planned)')
 
-    df['det_type'] = df['det_name'].apply(lambda x: x[0])
-    # here GERDA ICPCs will be marked as 'ICPC (new)' via LABELS['V']
-    df['label'] = df['det_name'].apply(lambda x: LABELS[x[0]])
-    # change label for GERDA ICPCs
-    df.loc[ df[ (df['det_type'] == 'V') & (df['order'] == 0) ].index, 'label'] = 'ICPC (GERDA)'
+    print('total number of detectors: {}'.format(int(fleet['count'].sum())))
+    print('total mass: {}'.format(fleet['mass_kg'].sum()))
+    for label, row in fleet.iterrows():
+        print('----' + label)
+        print('{} detectors - {}kg'.format(row['count'], row['mass']))
+    print('leftover: {}kg'.format(dfpie.loc['ICPC (planned)', 'mass']))
+    print(dfpie[['mass', 'color', 'label']])
 
     ## 2. Plot pie
-
-    # empty dataframe to fill later
-    dfpie = pd.DataFrame(columns=['mass', 'det_type', 'color', 'label'])
-    dfpie = dfpie.set_index('det_type')
-
-    for label, group in df.groupby('label'):
-        print('----' + label)
-        dfpie.at[label, 'mass'] = int(round(group['mass'].sum(), 0))
-        num = len(group)
-        dfpie.at[label, 'label'] = '{}\n{} detectors\n{}kg'.format(label, num, dfpie.loc[label]['mass'])
-        dfpie.at[label, 'color'] = COLORS[label]
-        print('{} detectors - {}kg'.format(num, dfpie.loc[label]['mass']))
-
-    ## leftover from 200kg
-    label = 'ICPC (planned)'
-    dfpie.at[label, 'mass'] = 200 - dfpie['mass'].sum()
-    dfpie.at[label, 'color'] = COLORS[label]
-    dfpie.at[label, 'label'] = '{}\n{}kg'.format(label, dfpie.loc[label]['mass'])
-    print('leftover: {}kg'.format(dfpie.loc[label]['mass']))
-
-    dfpie = dfpie.sort_values('det_type')
-    print(dfpie)
+    import matplotlib.pyplot as plt
+    # increase all font sizes
+    plt.rcParams.update({'font.size': 10})
 
     fig, ax = plt.subplots(figsize=(4,4))
-    _, _, pcts = ax.pie(dfpie['mass'], labels=dfpie['label'], autopct='%1.f%%',\
-            colors=dfpie['color'], shadow=False, startangle=90,\
-            explode = [0.02]*len(dfpie))
-    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
-
-    # total text (comment out if not wanted)
-    total_text = "Total mass: {} kg".format(int(round(df['mass'].sum(),0)))
-    total_text += "\nTotal # detectors: {}".format(len(df))
-    fig.text(0.82, 0.15, total_text)
-
-    plt.setp(pcts, color='white')#, fontweight='bold')
+    with profiling.stage('plotting'):
+        _, _, pcts = ax.pie(dfpie['mass'].astype(float), labels=dfpie['label'], autopct='%1.f%%',\
+                colors=dfpie['color'], shadow=False, startangle=90,\
+                explode = [0.02]*len(dfpie))
+        ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+
+        # total text (comment out if not wanted)
+        total_text = "Total mass: {} kg".format(int(round(fleet['mass_kg'].sum(),0)))
+        total_text += "\nTotal # detectors: {}".format(int(fleet['count'].sum()))
+        fig.text(0.82, 0.15, total_text)
+
+        plt.setp(pcts, color='white')#, fontweight='bold')
     # plt.tight_layout()
     figname = 'L200_detector_pie'
     print('Saving as {}'.format(figname))
-    plt.savefig(figname + '.pdf', bbox_inches='tight')
-    plt.savefig(figname + '.png', bbox_inches='tight')
+    with profiling.stage('savefig', files=2):
+        plt.savefig(figname + '.pdf', bbox_inches='tight')
+        plt.savefig(figname + '.png', bbox_inches='tight')
+
+
+def fleet_summary(metadata_path=METADATA_PATH, df=None, target=200):
+    '''
+    (string, pd.DataFrame, float) -> pd.DataFrame
+
+    Return mass and number of detectors per category (LABELS, GERDA ICPCs = order 0 separately)
+    and the planned remainder up to the target mass; no plotting, matplotlib is not imported
+
+    metadata_path [string]: path to folder with detector metadata jsons
+    df [pd.DataFrame]: info_table() result with mass to summarize instead of reading metadata_path
+    target [float]: target mass in kg, the rest is 'ICPC (planned)'
+
+    >>> fleet_summary()
+                    mass  count    mass_kg    color                             label
+    det_type
+    BEGe (GERDA)      XX     30  XX.XXXX  #2ca02c  BEGe (GERDA)\n30 detectors\nXXkg
+    ...
+    ICPC (planned)    XX      0   XX.XXXX  #cccccc              ICPC (planned)\nXXkg
+    '''
+    if df is None:
+        df = info_table(['mass'], metadata_path, det_type='all')
+
+    # here GERDA ICPCs will be marked as 'ICPC (new)' via LABELS['V'], then changed by order 0
+    det_type = df['det_name'].astype(str).str[0]
+    label = det_type.map(LABELS).mask((det_type == 'V') & (df['order'] == 0), 'ICPC (GERDA)')
+
+    dfpie = df['mass'].astype(float).groupby(label).agg(['sum', 'size'])
+    dfpie.columns = ['mass_kg', 'count']
+    dfpie['mass'] = dfpie['mass_kg'].round(0).astype(int)
+
+    ## leftover from target
+    # nothing left to plan once the target is reached
+    planned = max(target - dfpie['mass'].sum(), 0)
+    dfpie.loc['ICPC (planned)'] = {'mass_kg': float(planned), 'count': 0, 'mass': planned}
+
+    dfpie['color'] = dfpie.index.map(COLORS)
+    # planned mass has no detectors yet
+    dfpie['label'] = ['{}\n{} detectors\n{}kg'.format(l, c, m) if c > 0 else '{}\n{}kg'.format(l, m)\
+        for l, c, m in zip(dfpie.index, dfpie['count'], dfpie['mass'])]
+    dfpie.index.name = 'det_type'
+
+    return dfpie[['mass', 'count', 'mass_kg', 'color', 'label']].sort_index()
+
 
 if __name__ == '__main__':
     det_pie()
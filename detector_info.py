@@ -0,0 +1,209 @@
+'''
+Command line interface: python -m detector_info <command> ...
+
+    table     table of parameters for each detector (see info_table())
+    plot      parameters vs detector name (see params_vs_det())
+    pie       pie chart of L200 detector production (see det_pie())
+    migrate   convert old format jsons to the new format (see parse_old_to_new())
+    crystals  crystal jsons from the detectors (see crystal_json())
+    pack      pack a metadata folder into one snapshot file (see export_snapshot())
+    unpack    unpack a snapshot file into a metadata folder (see import_snapshot())
+    diff      changed JSON_FIELDS values between two trees or snapshots (see diff_trees())
+    validate  check all jsons of a tree against the expected structure (see validate_tree())
+    serve     keep tables in memory and answer info_table() queries locally (see table_server.py)
+
+Heavy modules (pandas, matplotlib) are imported only by the commands that need them;
+`table --cache` answers from the column cache in plain python.
+
+>>> python -m detector_info table mass fwhm_Qbb --type B --cache
+det_name,order,mass,fwhm_Qbb
+B00000A,0,0.496,2.37
+...
+'''
+import sys
+import csv
+import contextlib
+import json
+import argparse
+
+import info_table
+from info_table import METADATA_PATH
+
+# -------------------------------------------------------------------------------
+
+def table(args):
+    ''' Print info_table() as csv or json, with the values as stored in the jsons '''
+    columns = ['det_name', 'order'] + args.params
+    if args.cache:
+        # plain python from the column cache, no pandas
+        records = info_table.cached_records(args.params, args.path, args.type, args.max_order, args.where)
+    else:
+        records = info_table.json_records(args.params, args.path, args.type, args.max_order, args.where, args.workers)
+        # missing values report on stderr, the table on stdout
+        report = info_table.missing_report(info_table.pd.DataFrame(records, columns=columns), args.params)
+        if report: print(report, file=sys.stderr)
+
+    if args.format == 'json':
+        json.dump(records, sys.stdout, indent=1, default=str)
+        print()
+    else:
+        writer = csv.DictWriter(sys.stdout, fieldnames=columns, lineterminator='\n')
+        writer.writeheader()
+        for rec in records:
+            writer.writerow({c: '' if rec[c] is None else rec[c] for c in columns})
+
+
+def plot(args):
+    ''' Plot params_vs_det() '''
+    from param_vs_det import params_vs_det
+    params_vs_det(args.params, args.type, args.avg, args.path)
+
+
+def pie(args):
+    ''' Plot det_pie() '''
+    from det_pie import det_pie
+    det_pie(args.path)
+
+
+def migrate(args):
+    ''' Run parse_old_to_new() '''
+    import old_to_new_format
+    report = old_to_new_format.parse_old_to_new(args.path, args.out, args.workers, args.dry_run, args.force)
+    if args.report is not None:
+        report.to_csv(args.report, index=False)
+    # non-zero exit status if any file could not be converted
+    return 1 if (report['level'] == 'error').any() else 0
+
+
+def crystals(args):
+    ''' Run crystal_json() '''
+    import old_to_new_format
+    old_to_new_format.crystal_json(args.path, args.out, args.type)
+
+
+def pack(args):
+    ''' Run export_snapshot() '''
+    print(info_table.export_snapshot(args.path, args.out, args.level))
+
+
+def unpack(args):
+    ''' Run import_snapshot() '''
+    names = info_table.import_snapshot(args.snapshot, args.out)
+    print('{} detector jsons written to {}'.format(len(names), args.out))
+
+
+def diff(args):
+    ''' Print diff_trees() as csv or json; exit status 1 if the trees differ (like diff) '''
+    from tree_diff import diff_trees
+    # summary line on stderr, the table on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        df = diff_trees(args.a, args.b, args.workers)
+    if args.format == 'json':
+        print(df.to_json(orient='records'))
+    else:
+        df.to_csv(sys.stdout, index=False)
+    return 1 if len(df) > 0 else 0
+
+
+def validate(args):
+    ''' Run validate_tree(); exit status 1 if there are problems '''
+    from validation import validate_tree, problems
+    report = validate_tree(args.path, args.workers)
+    if args.report is not None:
+        report.to_csv(args.report, index=False)
+    return 1 if problems(report).any() else 0
+
+
+def serve(args):
+    ''' Run the query server until interrupted '''
+    from table_server import serve
+    serve(args.path, args.socket if args.socket is not None else (args.host, args.port), interval=args.interval)
+
+# -------------------------------------------------------------------------------
+
+def parser():
+    ''' () -> argparse.ArgumentParser '''
+    parser = argparse.ArgumentParser(prog='python -m detector_info', description='LEGEND detector metadata tables and plots')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('table', help='table of parameters for each detector')
+    p.add_argument('params', nargs='+', help='parameter keywords as defined in JSON_FIELDS')
+    p.add_argument('--path', default=METADATA_PATH, help='folder with detector metadata jsons')
+    p.add_argument('--type', nargs='+', default='all', help='detector types, V=ICPC, B=BEGe, P=PPC, C=Coax (default all)')
+    p.add_argument('--max-order', type=int, default=10000, help='maximum order')
+    p.add_argument('--where', default=None, help='filter, e.g. "order in {7,8} and mass > 2000" (mass in g)')
+    p.add_argument('--cache', action='store_true', help='answer from the column cache (fast, no pandas)')
+    p.add_argument('--workers', type=int, default=1, help='jsons read concurrently')
+    p.add_argument('--format', choices=['csv', 'json'], default='csv', help='output format')
+    p.set_defaults(func=table)
+
+    p = sub.add_parser('plot', help='parameters vs detector name')
+    p.add_argument('params', nargs='+', help='parameter keywords as defined in JSON_FIELDS')
+    p.add_argument('--path', default=METADATA_PATH, help='folder with detector metadata jsons')
+    p.add_argument('--type', nargs='+', default=['V'], help='detector types (default V)')
+    p.add_argument('--avg', action='store_true', help='plot averages')
+    p.set_defaults(func=plot)
+
+    p = sub.add_parser('pie', help='pie chart of L200 detector production')
+    p.add_argument('--path', default=METADATA_PATH, help='folder with detector metadata jsons')
+    p.set_defaults(func=pie)
+
+    for name, func, text in [('migrate', migrate, 'convert old format jsons to the new format'), ('crystals', crystals, 'crystal jsons from the detectors')]:
+        p = sub.add_parser(name, help=text)
+        p.add_argument('--path', default=None, help='folder with old format detector jsons')
+        p.add_argument('--out', default=None, help='output folder (default TEST_PATH in old_to_new_format.py)')
+        p.set_defaults(func=func)
+        if name == 'migrate':
+            p.add_argument('--workers', type=int, default=1, help='files converted in parallel processes')
+            p.add_argument('--dry-run', action='store_true', help='convert and report problems, write nothing')
+            p.add_argument('--force', action='store_true', help='convert all files, ignore the manifest of the last run')
+            p.add_argument('--report', default=None, help='save the error/warning report as csv')
+        else:
+            p.add_argument('--type', nargs='+', default='all', help='detector types, V=ICPC, B=BEGe, P=PPC, C=Coax (default all)')
+
+    p = sub.add_parser('pack', help='pack a metadata folder into one snapshot file')
+    p.add_argument('--path', default=METADATA_PATH, help='folder with detector metadata jsons')
+    p.add_argument('--out', default=None, help='snapshot file (default folder name + .snap)')
+    p.add_argument('--level', type=int, default=6, help='zlib compression level')
+    p.set_defaults(func=pack)
+
+    p = sub.add_parser('unpack', help='unpack a snapshot file into a metadata folder')
+    p.add_argument('snapshot', help='snapshot file')
+    p.add_argument('out', help='output folder')
+    p.set_defaults(func=unpack)
+
+    p = sub.add_parser('diff', help='changed values between two metadata trees or snapshots')
+    p.add_argument('a', help='reference metadata folder or snapshot')
+    p.add_argument('b', help='metadata folder or snapshot (old format jsons are converted before comparing)')
+    p.add_argument('--workers', type=int, default=8, help='files read concurrently')
+    p.add_argument('--format', choices=['csv', 'json'], default='csv', help='output format')
+    p.set_defaults(func=diff)
+
+    p = sub.add_parser('validate', help='check all jsons of a tree against the expected structure')
+    p.add_argument('--path', default=METADATA_PATH, help='folder with detector metadata jsons or snapshot')
+    p.add_argument('--workers', type=int, default=None, help='processes (default number of cpus)')
+    p.add_argument('--report', default=None, help='save the per-field report as csv')
+    p.set_defaults(func=validate)
+
+    p = sub.add_parser('serve', help='keep tables in memory and answer info_table() queries locally')
+    p.add_argument('--path', nargs='+', default=[METADATA_PATH], help='folders with detector metadata jsons or snapshots (first one is the default)')
+    p.add_argument('--socket', default=None, help='path of a Unix socket to listen on instead of http')
+    p.add_argument('--host', default='127.0.0.1', help='http host')
+    p.add_argument('--port', type=int, default=8765, help='http port')
+    p.add_argument('--interval', type=float, default=2., help='seconds between checks for changed files')
+    p.set_defaults(func=serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if args.command in ['migrate', 'crystals']:
+        import old_to_new_format
+        if args.path is None: args.path = old_to_new_format.METADATA_PATH
+        if args.out is None: args.out = old_to_new_format.TEST_PATH
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,48 @@
 import os
+import re
+import ast
 import json
-import pandas as pd
+import time
+import operator
+import hashlib
+import threading
+import zlib
+import mmap
+import struct
+import importlib.util
+import sys
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import profiling
+
+
+def lazy_import(name):
+    '''
+    (string) -> module
+
+    Import module on first attribute access (e.g. pandas is not needed for cached queries from the command line)
+    '''
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+pd = lazy_import('pandas')
+
+# optional accelerated json parsers, see load_json()
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # -------------------------------------------------------------------------------
 
@@ -36,6 +78,7 @@ JSON_FIELDS = {
     'enr': ['production', 'enrichment'],
     'repr': ['production', 'reprocessing'],
     'cry': ['production', 'crystal'],
+    'serialno': ['production', 'serialno'],
     # 'taper': ['geometry', 'taper', 'bottom', 'outer', 'height_in_mm'],
     'top_taper_angle': ['geometry', 'taper', 'top', 'angle_in_deg'],
     'top_taper_height': ['geometry', 'taper', 'top', 'height_in_mm'],
@@ -46,18 +89,96 @@ JSON_FIELDS = {
     'bull': ['geometry', 'bulletization', 'top_radius_in_mm']
 }
 
+# detector name: type, order, crystal code, slice (e.g. V06643A, B00091D, GERDA Coax C000RG1, C00ANG3)
+DET_NAME = re.compile(r'^([A-Z])(\d{2})(\w{3})(\w*)$')
+
+# attributes that can be filtered on (see parse_where()) without opening the jsons -> position in DetectorIndex records
+NAME_ATTRS = {'type': 0, 'order': 1, 'crystal': 2, 'slice': 3}
+
+# comparison operators allowed in filters
+WHERE_OPS = {
+    '==': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    'in': lambda a, b: a in b, 'not in': lambda a, b: a not in b
+}
+
+# old format json paths of the parameters whose JSON_FIELDS path is not the migrated one (see field_accessors()):
+# the migration keeps the old FWHM / survival fraction keys (res -> fwhm, sf -> survival_fraction) and renames depV,
+# JSON_FIELDS follows the L200 layout; migrated jsons are read at the target paths of these (schema version 'migrated')
+OLD_FIELDS = {
+    'depV': ['production', 'dep_voltage_in_V'],
+    'fwhm_Qbb': ['characterization', 'l200_site', 'res', 'qbb_in_keV'],
+    'fwhm_Co60': ['characterization', 'l200_site', 'res', 'cofep_in_keV'],
+    'fwhm_TlFEP': ['characterization', 'l200_site', 'res', 'tlfep_in_keV'],
+    'sf_TlDEP': ['characterization', 'l200_site', 'sf', 'tldep_in_pc'],
+    'sf_Qbb': ['characterization', 'l200_site', 'sf', 'qbb_in_pc'],
+    'sf_TlSEP': ['characterization', 'l200_site', 'sf', 'tlsep_in_pc'],
+    'sf_TlFEP': ['characterization', 'l200_site', 'sf', 'tlfep_in_pc'],
+}
+# keys only written by parse_old_to_new(), at the migrated paths of OLD_FIELDS (see schema_version());
+# survival_fraction is in both layouts, its keys differ (qbb_in_pc vs qbb)
+MIGRATED_KEYS = [
+    ['production', 'depletion_voltage_in_V'],
+    ['characterization', 'l200_site', 'fwhm'],
+] + [['characterization', 'l200_site', 'survival_fraction', src] for src in ['tldep_in_pc', 'qbb_in_pc', 'tlsep_in_pc', 'tlfep_in_pc']]
+
+# json parser: 'auto' picks the fastest installed one (simdjson on-demand > orjson > json)
+JSON_BACKEND = 'auto'
+
+# column types of the tables (see typed_column()), other columns are float32 or nullable Int32 if numeric
+COLUMN_TYPES = {
+    'det_name': 'category',
+    'order': 'int8',
+    'man': 'category',
+    'cry': 'category',
+    'daq': 'category',
+    'date': 'datetime',
+    'repr': 'boolean',
+    # written back to crystal jsons, keep exact values
+    'enr': 'float64',
+}
+
+# column caches (see update_cache()) are kept per user, one file per metadata folder (see cache_file()),
+# nothing is written into the metadata folder (read-only or shared checkouts, git repos);
+# plain json -> nothing in it is executed when loading
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'detector_info')
+# increase when the content of the cache changes, older caches are rebuilt
+CACHE_VERSION = 4
+# values stored per detector in the cache
+CACHE_COLUMNS = list(JSON_FIELDS) + ['mtime_ns', 'size', 'hash']
+
+# packed single file snapshot of a metadata folder (see export_snapshot())
+SNAPSHOT_MAGIC = b'DETSNAP\n'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_EXT = '.snap'
+# entries of the sorted name index: name (padded with zeros), row offset, row length, document offset, document length
+SNAPSHOT_NAME_WIDTH = 16
+SNAPSHOT_ENTRY = struct.Struct('<{}sQIQI'.format(SNAPSHOT_NAME_WIDTH))
+
 # -------------------------------------------------------------------------------
 
-def info_table(params, metadata_path=METADATA_PATH, det_type='all', max_order=10000):
+def info_table(params, metadata_path=METADATA_PATH, det_type='all', max_order=10000, cache=False, workers=1, catalog=True, where=None):
     '''
-    (list, string, list, int) -> pd.DataFrame
+    (list, string, list, int, bool|string, int, bool|DetectorCatalog, string|list) -> pd.DataFrame
 
     Construct a DataFrame with given parameters as columns for each detector
 
     params [list]: list of parameter keywords as defined in JSON_FIELDS
-    metadata_path [string]: path to folder with detector metadata jsons
+    metadata_path [string]: path to folder with detector metadata jsons (new or old format, see field_accessors()),
+        or snapshot file (see export_snapshot())
     det_type [list|string]: string or list of strings - detector type(s) to analyze, V=ICPC, B=BEGe, P=PPC, C=Coax (semi-coax), 'all' for all types
     max_order [int]: maximum order to plot (default all orders)
+    cache [bool|string]: read values from the column cache (see update_cache()) instead of parsing all jsons;
+        True for the default cache file (per user, see cache_file()), or path to the cache file
+    workers [int]: number of jsons to read concurrently when not using the cache (see get_params())
+    catalog [bool|DetectorCatalog]: True (default) to project the columns from the catalog shared within the process
+        (each json is parsed once per process, see get_catalog()), a DetectorCatalog to use, or False to read the jsons directly;
+        while the shared catalog is not loaded, selections narrowed by name filters (where) read only their jsons
+        (same result, only fewer files are read)
+    where [string|list]: keep only detectors passing the filter, e.g. "order in {7,8} and man == 'Mirion'" (see parse_where());
+        filters on type, order, crystal and slice are applied to the names before any json is read,
+        filters on parameters are applied to the values as stored in the jsons (mass in g), on every read path
+        (catalog, cache or jsons, see filter_rows())
 
     >>> info_table(['mass', 'fwhm_Qbb'], 'legend-detectors/germanium/detectors/', ['B'])
        det_name  order   mass  fwhm_Qbb
@@ -76,50 +197,1161 @@ def info_table(params, metadata_path=METADATA_PATH, det_type='all', max_order=10
 
     # list of detector names
     det_list = detector_list(metadata_path, max_order, det_type)
+    if where is not None:
+        # name filters before any json is read
+        n_selected = len(det_list)
+        det_list = select_names(det_list, parse_where(where))
+        if catalog is True and metadata_path not in CATALOGS and len(det_list) < n_selected:
+            # loading the catalog would parse the whole folder for a few detectors;
+            # both paths check the filters on the same values, the result does not depend on which one is taken
+            catalog = False
 
     ## get parameters from metadata
-    df = get_params(det_list, params, metadata_path)
-    df = df.sort_values(['order', 'det_name'])
-    if 'mass' in params: df['mass'] = df['mass'] / 1000. # g -> kg
+    if catalog:
+        if catalog is True:
+            catalog = get_catalog(metadata_path, cache, workers)
+        df = catalog.project(det_list, params, where)
+    elif cache:
+        df = get_params_cached(det_list, params, metadata_path, None if cache is True else cache, where)
+    else:
+        df = get_params(det_list, params, metadata_path, workers=workers, where=where)
+    with profiling.stage('sort'):
+        df = df.sort_values(['order', 'det_name'])
+    df = convert_units(df, params)
+
+    # one summary instead of a line per missing field
+    report = missing_report(df, params)
+    if report: print(report)
 
     return df
 
+
+def typed_table(df):
+    '''
+    (pd.DataFrame) -> pd.DataFrame
+
+    Convert all columns with typed_column()
+    '''
+    for col in df.columns:
+        df[col] = typed_column(df[col], col)
+    return df
+
+
+def typed_column(values, param):
+    '''
+    (pd.Series, string) -> pd.Series
+
+    Return column with compact type: COLUMN_TYPES if defined for param, otherwise numbers as float32
+    (nullable Int32 if all integers); missing values (None) become NA. Other columns are left as they are.
+
+    values [pd.Series]: column of values as read from jsons
+    param [string]: parameter keyword (or det_name/order)
+    '''
+    kind = COLUMN_TYPES.get(param)
+    if kind is not None:
+        if kind == 'datetime':
+            if pd.api.types.is_datetime64_any_dtype(values): return values
+            return pd.to_datetime(values, format='%Y-%m-%d', errors='coerce')
+        if values.dtype == kind:
+            return values
+        try:
+            return values.astype(kind)
+        except (TypeError, ValueError):
+            # unexpected values (e.g. old format) -> keep as they are
+            return values
+
+    if values.dtype in ['float32', 'Int32']:
+        return values
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred == 'integer':
+        return values.astype('Int32')
+    if inferred in ['floating', 'mixed-integer-float', 'empty']:
+        return values.astype('float32')
+
+    return values
+
+
+def missing_report(df, params):
+    '''
+    (pd.DataFrame, list) -> string
+
+    Return summary of missing values (NA) per parameter with a few example detectors, empty if nothing is missing
+    '''
+    lines = []
+    for p in params:
+        missing = df[p].isna().to_numpy()
+        n = int(missing.sum())
+        if n == 0: continue
+        names = [str(x) for x in df['det_name'].to_numpy()[missing][:6]]
+        lines.append('  {}: {} of {} detectors ({}{})'.format(p, n, len(df), ', '.join(names[:5]), ', ...' if n > 5 else ''))
+
+    if len(lines) == 0:
+        return ''
+    return 'Missing values:\n' + '\n'.join(lines)
+
+
+def convert_units(df, params):
+    '''
+    (pd.DataFrame, list) -> pd.DataFrame
+
+    Convert json units to the ones used in tables and plots (mass g -> kg)
+    '''
+    if 'mass' in params: df['mass'] = df['mass'] / 1000. # g -> kg
+    return df
+
+# -------------------------------------------------------------------------------
+# detector name index
+# -------------------------------------------------------------------------------
+
+class DetectorIndex:
+    '''
+    Index of detector json names in a metadata folder, each name parsed once into type, order, crystal and slice (see DET_NAME);
+    other files are ignored, other jsons are reported on scan()
+
+    >>> index = DetectorIndex('legend-detectors/germanium/detectors/')
+    >>> index.records['V06643A']
+    ('V', 6, '643', 'A')
+    >>> index.select(det_type=['V'], min_order=6, max_order=7)
+    ['V06643A', 'V06649A', ..., 'V07647B']
+    '''
+
+    def __init__(self, metadata_path=METADATA_PATH):
+        '''
+        metadata_path [string]: path to folder with detector metadata jsons
+        '''
+        self.metadata_path = metadata_path
+        self.scan()
+
+    def scan(self):
+        ''' (Re)build the index from the metadata folder '''
+        # folder mtime changes when files are added, removed or renamed
+        self.mtime_ns = os.stat(self.metadata_path).st_mtime_ns
+
+        # detector name -> (type, order, crystal, slice)
+        self.records = {}
+        with profiling.stage('listdir') as st:
+            if is_snapshot(self.metadata_path):
+                files = [det + '.json' for det in get_snapshot(self.metadata_path).names]
+            else:
+                with os.scandir(self.metadata_path) as it:
+                    files = [entry.name for entry in it]
+            skipped = []
+            for file in files:
+                if not file.endswith('.json'):
+                    continue
+                name = file[:-len('.json')]
+                m = DET_NAME.match(name)
+                if m is None:
+                    skipped.append(file)
+                    continue
+                self.records[name] = (m.group(1), int(m.group(2)), m.group(3), m.group(4))
+            st.files = len(self.records)
+        if skipped:
+            print('Skipped {} json(s) not named like detectors in {}: {}'.format(len(skipped), self.metadata_path, ', '.join(sorted(skipped))))
+
+        self.names = sorted(self.records)
+        # lookup tables -> sorted lists of names
+        self.by_type = {}
+        self.by_order = {}
+        self.by_crystal = {}
+        for name in self.names:
+            dtype, order, crystal, _ = self.records[name]
+            self.by_type.setdefault(dtype, []).append(name)
+            self.by_order.setdefault(order, []).append(name)
+            self.by_crystal.setdefault(crystal, []).append(name)
+
+    def select(self, det_type=None, min_order=None, max_order=None, crystal=None, regex=None):
+        '''
+        (list, int, int, list|string, string) -> list
+
+        Return sorted list of detector names matching all given criteria (None = no selection)
+
+        det_type [list|string]: detector type(s), V=ICPC, B=BEGe, P=PPC, C=Coax (semi-coax)
+        min_order [int]: minimum order
+        max_order [int]: maximum order
+        crystal [list|string]: crystal code(s), e.g. '643'
+        regex [string]: regular expression the detector name has to match
+        '''
+        selected = None
+
+        def restrict(names):
+            return set(names) if selected is None else selected & set(names)
+
+        if det_type is not None:
+            if isinstance(det_type, str): det_type = [det_type]
+            selected = restrict([x for t in det_type for x in self.by_type.get(t, [])])
+        if min_order is not None or max_order is not None:
+            lo = -1 if min_order is None else min_order
+            hi = 100 if max_order is None else max_order
+            selected = restrict([x for o in self.by_order if lo <= o <= hi for x in self.by_order[o]])
+        if crystal is not None:
+            if isinstance(crystal, str): crystal = [crystal]
+            selected = restrict([x for c in crystal for x in self.by_crystal.get(c, [])])
+        if regex is not None:
+            pattern = re.compile(regex)
+            selected = restrict([x for x in (self.names if selected is None else selected) if pattern.search(x)])
+
+        if selected is None:
+            return list(self.names)
+        return sorted(selected)
+
+
+# indices shared within the process, by metadata path
+INDICES = {}
+
+def get_index(metadata_path=METADATA_PATH):
+    '''
+    (string) -> DetectorIndex
+
+    Return the name index of given metadata folder shared within the process;
+    it is rebuilt only if files were added or removed since (folder mtime changed)
+
+    metadata_path [string]: path to folder with detector metadata jsons
+    '''
+    index = INDICES.get(metadata_path)
+    if index is None:
+        index = INDICES[metadata_path] = DetectorIndex(metadata_path)
+    elif os.stat(metadata_path).st_mtime_ns != index.mtime_ns:
+        index.scan()
+
+    return index
+
+# -------------------------------------------------------------------------------
+# detector catalog
+# -------------------------------------------------------------------------------
+
+class DetectorCatalog:
+    '''
+    Wide table with the values of all JSON_FIELDS for all detectors in a metadata folder, kept in memory
+
+    Each json is read once and all fields are extracted in one walk over FIELD_TREE;
+    tables for given parameters are then column projections (see project()).
+    load() again re-reads only the jsons added or changed since (by mtime and size, see file_stats())
+
+    >>> cat = DetectorCatalog('legend-detectors/germanium/detectors/')
+    >>> cat.project(['V06643A', 'V06649A'], ['mass', 'fwhm_Qbb'])
+         det_name  order    mass  fwhm_Qbb
+      0  V06643A      6  2286.2      2.54
+      1  V06649A      6  2597.3      2.26
+    '''
+
+    def __init__(self, metadata_path=METADATA_PATH, cache=False, workers=1):
+        '''
+        metadata_path [string]: path to folder with detector metadata jsons
+        cache [bool|string]: fill the table from the column cache (see update_cache())
+        workers [int]: number of jsons to read concurrently when not using the cache
+        '''
+        self.metadata_path = metadata_path
+        self.cache = cache
+        self.workers = workers
+        self.table = None
+        # detector name -> (mtime, size) and values in order of JSON_FIELDS, of the files the table was built from
+        self.stats = {}
+        self.rows = {}
+        self.load()
+
+    def stale(self):
+        ''' () -> bool: whether jsons were added, removed or changed since the last load() '''
+        return file_stats(self.metadata_path) != self.stats
+
+    def load(self):
+        ''' (Re)read the metadata folder into the wide table indexed by detector name, parsing only changed jsons '''
+        stats = file_stats(self.metadata_path)
+        fields = list(JSON_FIELDS)
+        if is_snapshot(self.metadata_path):
+            # columns are stored in the snapshot
+            snap = get_snapshot(self.metadata_path)
+            cols = {p: snap.column(p) for p in fields}
+            rows = dict(zip(snap.names, map(list, zip(*cols.values()))))
+            with profiling.stage('DataFrame construction'):
+                table = typed_table(pd.DataFrame(cols, index=list(snap.names)))
+        else:
+            if self.cache:
+                cached = refresh_cache(self.metadata_path, None if self.cache is True else self.cache)
+                det_list = sorted(cached)
+                rows = {det: cached[det][:len(fields)] for det in det_list}
+            else:
+                det_list = sorted(stats)
+                changed = [det for det in det_list if self.stats.get(det) != stats[det]]
+                rows = {det: self.rows[det] for det in det_list if det in self.rows}
+                for rec in iter_detectors(fields, self.metadata_path, changed, workers=self.workers):
+                    rows[rec['det_name']] = [rec[p] for p in fields]
+            with profiling.stage('DataFrame construction'):
+                table = typed_table(pd.DataFrame([rows[det] for det in det_list], index=det_list, columns=fields))
+
+        # values as stored in the jsons, filters are checked on them (the table holds float32)
+        self.rows = rows
+        # order of each row, taken by project()
+        self.orders = pd.array([int(x[1:3]) for x in table.index], dtype=COLUMN_TYPES['order']).to_numpy()
+        self.table = table
+        self.stats = stats
+
+    def project(self, det_list, params, where=None):
+        '''
+        (list, list, string|list) -> pd.DataFrame
+
+        Return DataFrame of given parameters for given detectors, same format as get_params()
+
+        det_list [list]: list of detector names
+        params [list]: list of parameter keywords as defined in JSON_FIELDS
+        where [string|list]: filter, see parse_where()
+        '''
+        if where is not None:
+            det_list = filter_rows(self.rows, det_list, parse_where(where))
+        with profiling.stage('DataFrame construction'):
+            # columns are typed already -> positional take keeps the types, no conversion per query
+            pos = self.table.index.get_indexer(det_list)
+            if (pos < 0).any():
+                raise KeyError('Detectors not in the catalog: {}'.format([det for det, i in zip(det_list, pos) if i < 0]))
+            if all(a < b for a, b in zip(det_list, det_list[1:])):
+                # sorted names (as from DetectorIndex) are their own categories
+                names = pd.Categorical.from_codes(range(len(det_list)), categories=pd.Index(det_list))
+            else:
+                names = pd.Categorical(det_list)
+            cols = {'det_name': names, 'order': self.orders[pos]}
+            for p in params:
+                cols[p] = self.table[p].array.take(pos)
+            df = pd.DataFrame(cols)
+
+        return df
+
+
+# catalogs shared within the process, by metadata path
+CATALOGS = {}
+
+def get_catalog(metadata_path=METADATA_PATH, cache=False, workers=1):
+    '''
+    (string, bool|string, int) -> DetectorCatalog
+
+    Return the catalog of given metadata folder shared within the process, loading it on first use;
+    it is reloaded when jsons were added, removed or changed since (only those are parsed again, see DetectorCatalog.load())
+
+    metadata_path [string]: path to folder with detector metadata jsons
+    cache [bool|string]: see DetectorCatalog
+    workers [int]: see DetectorCatalog
+    '''
+    cat = CATALOGS.get(metadata_path)
+    if cat is None:
+        cat = CATALOGS[metadata_path] = DetectorCatalog(metadata_path, cache, workers)
+    elif cache != cat.cache or cat.stale():
+        cat.cache = cache
+        cat.load()
+
+    return cat
+
+
+def file_stats(metadata_path=METADATA_PATH):
+    '''
+    (string) -> dict
+
+    Return detector name -> (mtime, size) of each detector json of a metadata folder
+    (one stat per file, no file is opened); for a snapshot file {path: (mtime, size)} of the snapshot
+    '''
+    if is_snapshot(metadata_path):
+        st = os.stat(metadata_path)
+        return {metadata_path: (st.st_mtime_ns, st.st_size)}
+
+    res = {}
+    with os.scandir(metadata_path) as it:
+        for entry in it:
+            if not entry.name.endswith('.json'): continue
+            name = entry.name[:-len('.json')]
+            if DET_NAME.match(name) is None: continue
+            st = entry.stat()
+            res[name] = (st.st_mtime_ns, st.st_size)
+
+    return res
+
+# -------------------------------------------------------------------------------
+# packed snapshot
+# -------------------------------------------------------------------------------
+
+def export_snapshot(metadata_path=METADATA_PATH, snapshot_path=None, level=6):
+    '''
+    (string, string, int) -> string
+
+    Pack all detector jsons of a metadata folder into one snapshot file, which can be used instead of the folder
+    as metadata_path (info_table(), get_params(), ...); loading it is one sequential read instead of a file open per detector
+
+    File: SNAPSHOT_MAGIC, header length (8 bytes, little endian), json header (fields, number of detectors, sections),
+    then the sections (offsets relative to the end of the header):
+        index      sorted fixed width entries (SNAPSHOT_ENTRY): name, offset and length of its row and document
+        columns    values of all JSON_FIELDS as json columns (bulk loads, see DetectorSnapshot.column())
+        rows       values of all JSON_FIELDS of each detector as a json array (single detector lookups)
+        documents  zlib compressed raw jsons
+
+    metadata_path [string]: path to folder with detector metadata jsons
+    snapshot_path [string]: output file (default metadata folder name + SNAPSHOT_EXT next to the folder)
+    level [int]: zlib compression level
+
+    >>> export_snapshot('legend-detectors/germanium/detectors/')
+    'legend-detectors/germanium/detectors.snap'
+    '''
+    if snapshot_path is None:
+        snapshot_path = os.path.normpath(metadata_path) + SNAPSHOT_EXT
+
+    names = get_index(metadata_path).names
+    fields = list(JSON_FIELDS)
+    columns = {p: [] for p in fields}
+    rows, blobs = [], []
+    for det in names:
+        if len(det.encode()) > SNAPSHOT_NAME_WIDTH:
+            raise ValueError('Detector name {} is longer than {} bytes'.format(det, SNAPSHOT_NAME_WIDTH))
+        with open(os.path.join(metadata_path, det + '.json'), 'rb') as f:
+            raw = f.read()
+        vals = extract_fields(loads_json(raw))
+        for p, val in zip(fields, vals):
+            columns[p].append(val)
+        rows.append(json.dumps(vals, default=str).encode())
+        blobs.append(zlib.compress(raw, level))
+    columns = json.dumps(columns, default=str).encode()
+
+    ## sections
+    n = len(names)
+    sections = {'index': [0, n * SNAPSHOT_ENTRY.size]}
+    sections['columns'] = [sum(sections['index']), len(columns)]
+    sections['rows'] = [sum(sections['columns']), sum(len(row) for row in rows)]
+    sections['documents'] = [sum(sections['rows']), sum(len(blob) for blob in blobs)]
+    index = bytearray()
+    row_pos, doc_pos = sections['rows'][0], sections['documents'][0]
+    for det, row, blob in zip(names, rows, blobs):
+        index += SNAPSHOT_ENTRY.pack(det.encode(), row_pos, len(row), doc_pos, len(blob))
+        row_pos += len(row)
+        doc_pos += len(blob)
+
+    header = json.dumps({'version': SNAPSHOT_VERSION, 'fields': JSON_FIELDS, 'n': n, 'sections': sections, 'compression': 'zlib'}).encode()
+
+    # written next to the target and renamed, readers never see a partial file
+    tmp = snapshot_path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        f.write(index)
+        f.write(columns)
+        for part in [rows, blobs]:
+            for x in part:
+                f.write(x)
+    os.replace(tmp, snapshot_path)
+
+    return snapshot_path
+
+
+def import_snapshot(snapshot_path, metadata_path):
+    '''
+    (string, string) -> list
+
+    Unpack the raw detector jsons of a snapshot (see export_snapshot()) into a metadata folder; return detector names
+
+    snapshot_path [string]: snapshot file
+    metadata_path [string]: output folder
+    '''
+    snap = DetectorSnapshot(snapshot_path)
+    os.makedirs(metadata_path, exist_ok=True)
+    for det in snap.names:
+        with open(os.path.join(metadata_path, det + '.json'), 'wb') as f:
+            f.write(snap.raw(det))
+
+    return snap.names
+
+
+def is_snapshot(path):
+    ''' (string) -> bool: True if given metadata path is a snapshot file (see export_snapshot()) '''
+    if path in SNAPSHOTS:
+        return True
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+
+class DetectorSnapshot:
+    '''
+    Memory-mapped snapshot file (see export_snapshot())
+
+    Single detectors are found by binary search in the sorted fixed width name index and their row is decoded
+    from a slice of the mapped file (no copy, nothing else is read), so lookups do not depend on the size of the tree;
+    names and columns for bulk access are decoded on first use, documents are decompressed only when needed
+
+    >>> snap = DetectorSnapshot('legend-detectors/germanium/detectors.snap')
+    >>> snap.values('V06643A', ['mass', 'fwhm_Qbb'])
+    [2286.2, 2.54]
+    '''
+
+    def __init__(self, path):
+        '''
+        path [string]: snapshot file
+        '''
+        self.path = path
+        self.load()
+
+    def load(self):
+        ''' (Re)map the snapshot file '''
+        self.mtime_ns = os.stat(self.path).st_mtime_ns
+        with open(self.path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError('{} is not a detector snapshot'.format(self.path))
+
+        start = len(SNAPSHOT_MAGIC) + 8
+        size = int.from_bytes(self.map[len(SNAPSHOT_MAGIC):start], 'little')
+        header = json.loads(self.map[start:start+size])
+        if header['version'] != SNAPSHOT_VERSION:
+            raise ValueError('{}: snapshot version {} is not supported (expected {}), export it again'.format(self.path, header['version'], SNAPSHOT_VERSION))
+
+        self.view = memoryview(self.map)[start+size:]
+        self.n = header['n']
+        self.fields = header['fields']
+        # position of each field in the rows
+        self.field_pos = {p: i for i, p in enumerate(self.fields)}
+        self.sections = header['sections']
+        self.index = self.view[self.sections['index'][0]:sum(self.sections['index'])]
+        # names are compared as bytes sliced from the map (memoryviews cannot be ordered)
+        self.index_start = start + size + self.sections['index'][0]
+        # decoded on first use
+        self._names = None
+        self.columns = None
+
+    @property
+    def names(self):
+        ''' sorted detector names '''
+        if self._names is None:
+            self._names = [entry[0].rstrip(b'\0').decode() for entry in SNAPSHOT_ENTRY.iter_unpack(self.index)]
+        return self._names
+
+    def find(self, det):
+        '''
+        (string) -> int
+
+        Return position of given detector in the sorted index (binary search), KeyError if not in the snapshot
+        '''
+        key = det.encode().ljust(SNAPSHOT_NAME_WIDTH, b'\0')
+        size, start = SNAPSHOT_ENTRY.size, self.index_start
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.map[start+mid*size:start+mid*size+SNAPSHOT_NAME_WIDTH] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.n or self.map[start+lo*size:start+lo*size+SNAPSHOT_NAME_WIDTH] != key:
+            raise KeyError(det)
+        return lo
+
+    def raw(self, det):
+        ''' (string) -> bytes: raw json of given detector '''
+        _, _, _, pos, size = SNAPSHOT_ENTRY.unpack_from(self.index, self.find(det) * SNAPSHOT_ENTRY.size)
+        return zlib.decompress(self.view[pos:pos+size])
+
+    def document(self, det):
+        ''' (string) -> dict: parsed json of given detector '''
+        return loads_json(self.raw(det))
+
+    def column(self, param):
+        '''
+        (string) -> list
+
+        Return values of given parameter for all detectors (in order of names); the columns section is read on first use,
+        fields missing from the snapshot or with another json path are extracted from the documents once
+        '''
+        if self.columns is None:
+            pos, size = self.sections['columns']
+            with profiling.stage('snapshot read', files=1, nbytes=size):
+                self.columns = loads_json(self.view[pos:pos+size])
+        if param not in self.columns or self.fields.get(param) != JSON_FIELDS[param]:
+            self.columns[param] = [get_json_field(self.document(det), param) for det in self.names]
+            self.fields = dict(self.fields, **{param: JSON_FIELDS[param]})
+        return self.columns[param]
+
+    def values(self, det, params):
+        '''
+        (string, list) -> list
+
+        Return values of given parameters of one detector: from the columns if they were loaded,
+        otherwise only the row of the detector is decoded
+        '''
+        i = self.find(det)
+        if self.columns is not None:
+            return [self.column(p)[i] for p in params]
+
+        _, pos, size, _, _ = SNAPSHOT_ENTRY.unpack_from(self.index, i * SNAPSHOT_ENTRY.size)
+        row = loads_json(self.view[pos:pos+size], lazy=True)
+        stored = [self.fields.get(p) == JSON_FIELDS[p] for p in params]
+        res = [to_python(row[self.field_pos[p]]) if ok else None for p, ok in zip(params, stored)]
+        del row # on-demand document has to be released before the parser is reused by document()
+        for k, p in enumerate(params):
+            if not stored[k]:
+                # not stored in this snapshot
+                res[k] = get_json_field(self.document(det), p)
+        return res
+
+    def read_params(self, det, params, conds=[]):
+        '''
+        (string, list, list) -> list
+
+        Same as read_params() for a detector of the snapshot
+        '''
+        if len(conds) == 0 or all(check_cond(v, op, val) for v, (_, op, val) in zip(self.values(det, [c[0] for c in conds]), conds)):
+            return self.values(det, params)
+        return None
+
+
+# snapshots shared within the process, by path
+SNAPSHOTS = {}
+
+def get_snapshot(path):
+    '''
+    (string) -> DetectorSnapshot
+
+    Return the snapshot mapped from given file, shared within the process; it is mapped again if the file was replaced
+
+    path [string]: snapshot file
+    '''
+    snap = SNAPSHOTS.get(path)
+    if snap is None:
+        snap = SNAPSHOTS[path] = DetectorSnapshot(path)
+    elif os.stat(path).st_mtime_ns != snap.mtime_ns:
+        snap.load()
+
+    return snap
+
+
+def lookup(det, params, metadata_path=METADATA_PATH):
+    '''
+    (string, list, string) -> dict
+
+    Return values of given parameters of one detector as a dict (det_name, order, params), in plain python;
+    with a snapshot (see export_snapshot()) only the detector's row is decoded, so this takes microseconds
+    whatever the size of the tree (for online monitoring; use get_params() for tables)
+
+    det [string]: detector name
+    params [list]: list of parameter keywords as defined in JSON_FIELDS
+    metadata_path [string]: snapshot file, or path to folder with detector metadata jsons
+
+    >>> lookup('V06643A', ['mass', 'fwhm_Qbb'], 'legend-detectors/germanium/detectors.snap')
+    {'det_name': 'V06643A', 'order': 6, 'mass': 2286.2, 'fwhm_Qbb': 2.54}
+    '''
+    if is_snapshot(metadata_path):
+        vals = get_snapshot(metadata_path).values(det, params)
+    else:
+        vals = read_params(os.path.join(metadata_path, det + '.json'), params)
+    res = {'det_name': det, 'order': int(det[1:3])}
+    res.update(zip(params, vals))
+
+    return res
+
 # -------------------------------------------------------------------------------
 # helper functions
 # -------------------------------------------------------------------------------
 
-def get_params(det_list, params, metadata_path=METADATA_PATH):
+def get_params(det_list, params, metadata_path=METADATA_PATH, workers=1, executor='thread', where=None):
     '''
-    (list, list, string) -> dict
+    (list, list, string, int, string, string|list) -> pd.DataFrame
 
-    Return dict of given parameters values for given detector names
+    Return DataFrame of given parameters values for given detector names
 
     det_list [list]: list of detector json names (without extension)
     params [list]: list of parameter keywords as defined in JSON_FIELDS
-    metadata_path [string]: path to folder with detector metadata jsons
+    metadata_path [string]: path to folder with detector metadata jsons, or snapshot file (see export_snapshot())
+    workers [int]: number of jsons to read concurrently (1 = serial)
+    executor [string]: 'thread' (default, best when file access latency dominates) or 'process'
+    where [string|list]: filter, see parse_where(); detectors failing it are dropped while reading
 
     >>> get_params(['V06643A', 'V06649A'], ['mass', 'fwhm_Qbb'], 'legend-detectors/germanium/detectors/')
          det_name  order    mass  fwhm_Qbb
       0  V06643A      6  2286.2      2.54
       1  V06649A      6  2597.3      2.26
     '''
-
     # prepare empty result dict
+    res = {'det_name': [], 'order': []}
+    for p in params: res[p] = []
+
+    # obtain values of given params
+    for rec in iter_detectors(params, metadata_path, det_list, workers=workers, executor=executor, where=where):
+        for key in res:
+            res[key].append(rec[key])
+
+    with profiling.stage('DataFrame construction'):
+        df = typed_table(pd.DataFrame(res))
+
+    return df
+
+
+def iter_detectors(params, metadata_path=METADATA_PATH, det_list=None, det_type='all', max_order=10000,\
+        workers=1, executor='thread', where=None, chunksize=None):
+    '''
+    (list, string, list, list, int, int, string, string|list, int) -> generator
+
+    Yield one record (dict with det_name, order and given parameters) per detector, in order of det_list,
+    or DataFrames of up to chunksize records; only a few files are held in memory at a time
+
+    params [list]: list of parameter keywords as defined in JSON_FIELDS
+    metadata_path [string]: path to folder with detector metadata jsons
+    det_list [list]: list of detector json names (default selected with det_type and max_order, see detector_list())
+    det_type [list|string]: detector type(s) if det_list not given, 'all' for all types
+    max_order [int]: maximum order if det_list not given
+    workers [int]: number of jsons to read concurrently (1 = serial)
+    executor [string]: 'thread' (default, best when file access latency dominates) or 'process'
+    where [string|list]: filter, see parse_where(); detectors failing it are dropped while reading
+    chunksize [int]: yield DataFrames of this many records instead of single records
+
+    >>> for rec in iter_detectors(['mass'], det_type='V'): print(rec)
+    {'det_name': 'V00048A', 'order': 0, 'mass': 1815.8}
+    ...
+    '''
+    if det_list is None:
+        if det_type == 'all': det_type = ['B','C','P','V']
+        det_list = detector_list(metadata_path, max_order, det_type)
+
+    if chunksize is not None:
+        yield from iter_chunks(iter_detectors(params, metadata_path, det_list, workers=workers, executor=executor, where=where), params, chunksize)
+        return
+
+    # filters on detector names are applied before reading, the rest on the values while reading
+    conds = []
+    if where is not None:
+        conds = parse_where(where)
+        det_list = select_names(det_list, conds)
+        conds = [c for c in conds if c[0] not in NAME_ATTRS]
+
+    if is_snapshot(metadata_path):
+        # values from the columns of the snapshot, nothing to read
+        snap = get_snapshot(metadata_path)
+        ex = None
+        def values():
+            for det in det_list:
+                yield snap.read_params(det, params, conds)
+    elif workers > 1:
+        paths = [os.path.join(metadata_path, det + '.json') for det in det_list]
+        pool = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}[executor]
+        ex = pool(max_workers=workers)
+        # submit a few batches ahead only, to bound memory
+        batch = 16 * workers
+        def values():
+            for i in range(0, len(paths), batch):
+                part = paths[i:i+batch]
+                # map keeps the order of det_list
+                yield from ex.map(read_params, part, [params]*len(part), [conds]*len(part))
+    else:
+        paths = [os.path.join(metadata_path, det + '.json') for det in det_list]
+        ex = None
+        def values():
+            for path in paths:
+                yield read_params(path, params, conds)
+
+    try:
+        for det, vals in zip(det_list, values()):
+            # did not pass the filter
+            if vals is None: continue
+            rec = {'det_name': det, 'order': int(det[1:3])}
+            rec.update(zip(params, vals))
+            yield rec
+    finally:
+        if ex is not None: ex.shutdown()
+
+
+def iter_chunks(records, params, chunksize):
+    '''
+    (generator, list, int) -> generator
+
+    Group records from iter_detectors() into DataFrames of up to chunksize rows (same columns as get_params())
+    '''
+    columns = ['det_name', 'order'] + list(params)
+    chunk = []
+    for rec in records:
+        chunk.append(rec)
+        if len(chunk) == chunksize:
+            yield typed_table(pd.DataFrame(chunk, columns=columns))
+            chunk = []
+    if len(chunk) > 0:
+        yield typed_table(pd.DataFrame(chunk, columns=columns))
+
+
+def read_params(path, params, conds=[]):
+    '''
+    (string, list, list) -> list
+
+    Read one detector json and return the values of given parameters (in the same order, None for missing),
+    or None if the values do not pass given conditions
+
+    path [string]: path to detector json
+    params [list]: list of parameter keywords as defined in JSON_FIELDS
+    conds [list]: parameter conditions from parse_where()
+    '''
+    # read metadata file, only the given fields are decoded with an on-demand parser
+    js = load_json(path, lazy=True)
+    res = None
+    if len(conds) == 0 or all(check_cond(v, op, val) for v, (_, op, val) in zip(extract_params(js, [c[0] for c in conds]), conds)):
+        res = extract_params(js, params)
+    del js # on-demand document has to be released before the parser is reused
+
+    return res
+
+
+def extract_params(js, params):
+    '''
+    (dict, list) -> list
+
+    Return the values of given parameters from given json in one walk (see compile_fields()), None for missing;
+    jsons in the old format are read with the accessors of their schema version and normalized (see field_accessors())
+
+    js [dict]: detector metadata
+    params [list]: list of parameter keywords as defined in JSON_FIELDS
+    '''
+    # duplicated params are extracted once
+    uniq = list(dict.fromkeys(params))
+    version = schema_version(js)
+    key = (version, tuple(uniq))
+    if key not in FIELD_TREES:
+        fields = field_accessors(version)[0]
+        FIELD_TREES[key] = compile_fields({p: fields[p] for p in uniq})
+    vals = extract_fields(js, FIELD_TREES[key], len(uniq))
+    if version != 'new':
+        vals = normalize_values(vals, uniq, version)
+    if len(uniq) < len(params):
+        vals = dict(zip(uniq, vals))
+        vals = [vals[p] for p in params]
+
+    return vals
+
+
+def parse_where(where):
+    '''
+    (string|list) -> list
+
+    Return filter as a list of conditions (param, operator, value), all of which have to pass.
+    param is a keyword from JSON_FIELDS or one of NAME_ATTRS, operator one of WHERE_OPS, value a python literal
+
+    where [string|list]: conditions joined by 'and', e.g. "order in {7,8} and man == 'Mirion'", or list of condition tuples
+
+    >>> parse_where("order in {7,8} and mass > 2000")
+    [('order', 'in', {7, 8}), ('mass', '>', 2000)]
+    '''
+    if not isinstance(where, str):
+        conds = [tuple(c) for c in where]
+    else:
+        conds = []
+        for part in re.split(r'\s+and\s+', where.strip()):
+            m = re.match(r'^(\w+)\s*(==|!=|<=|>=|<|>|not\s+in|in)\s*(.+)$', part.strip())
+            if m is None:
+                raise ValueError('Cannot parse condition "{}"'.format(part))
+            conds.append((m.group(1), ' '.join(m.group(2).split()), ast.literal_eval(m.group(3).strip())))
+
+    for p, op, _ in conds:
+        if p not in JSON_FIELDS and p not in NAME_ATTRS:
+            raise ValueError('Unknown parameter {} in filter'.format(p))
+        if op not in WHERE_OPS:
+            raise ValueError('Unknown operator {} in filter'.format(op))
+
+    return conds
+
+
+def check_cond(value, op, ref):
+    '''
+    (value, string, value) -> bool
+
+    Return whether value passes the condition; values that cannot be compared (e.g. missing) do not pass
+    '''
+    # typed tables hold dates as timestamps, jsons as strings
+    if isinstance(ref, str) and type(value).__name__ == 'Timestamp':
+        value = value.strftime('%Y-%m-%d')
+    try:
+        return bool(WHERE_OPS[op](value, ref))
+    except TypeError:
+        return False
+
+
+def select_names(det_list, conds):
+    '''
+    (list, list) -> list
+
+    Return detectors passing the conditions on NAME_ATTRS (other conditions are ignored), without reading any json
+
+    det_list [list]: list of detector names
+    conds [list]: conditions from parse_where()
+    '''
+    conds = [(NAME_ATTRS[p], op, val) for p, op, val in conds if p in NAME_ATTRS]
+    if len(conds) == 0:
+        return det_list
+
+    res = []
+    for det in det_list:
+        m = DET_NAME.match(det)
+        if m is None: continue
+        attrs = (m.group(1), int(m.group(2)), m.group(3), m.group(4))
+        if all(check_cond(attrs[i], op, val) for i, op, val in conds):
+            res.append(det)
+
+    return res
+
+
+def filter_rows(rows, det_list, conds):
+    '''
+    (dict, list, list) -> list
+
+    Return detectors passing the conditions, name conditions first, then parameter values as stored in the jsons
+    (same values as read_params() checks, not the float32 columns of the tables)
+
+    rows [dict]: detector name -> values starting with JSON_FIELDS in their order (DetectorCatalog.rows or column cache rows)
+    det_list [list]: list of detector names
+    conds [list]: conditions from parse_where()
+    '''
+    det_list = select_names(det_list, conds)
+    col = {p: i for i, p in enumerate(JSON_FIELDS)}
+    for p, op, val in conds:
+        if p in NAME_ATTRS: continue
+        det_list = [det for det in det_list if check_cond(rows[det][col[p]], op, val)]
+
+    return det_list
+
+
+def benchmark_workers(params, metadata_path=METADATA_PATH, workers=[1, 2, 4, 8], executor='thread'):
+    '''
+    (list, string, list, string) -> pd.DataFrame
+
+    Time get_params() on all detectors in metadata_path for each number of workers
+
+    params [list]: list of parameter keywords as defined in JSON_FIELDS
+    metadata_path [string]: path to folder with detector metadata jsons
+    workers [list]: numbers of workers to compare
+    executor [string]: 'thread' or 'process', see get_params()
+
+    >>> benchmark_workers(['mass', 'fwhm_Qbb'])
+       workers  time_s  speedup
+    0        1   0.512     1.00
+    1        2   0.270     1.90
+    ...
+    '''
+    det_list = detector_list(metadata_path, 10000, ['B','C','P','V'])
+
+    res = {'workers': [], 'time_s': []}
+    for w in workers:
+        start = time.perf_counter()
+        get_params(det_list, params, metadata_path, workers=w, executor=executor)
+        res['workers'].append(w)
+        res['time_s'].append(time.perf_counter() - start)
+
+    df = pd.DataFrame(res)
+    df['speedup'] = df['time_s'].iloc[0] / df['time_s']
+    return df
+
+
+def get_params_cached(det_list, params, metadata_path=METADATA_PATH, cache_path=None, where=None):
+    '''
+    (list, list, string, string, string|list) -> pd.DataFrame
+
+    Same as get_params(), but values are taken from the column cache which is refreshed first (see update_cache())
+
+    det_list [list]: list of detector json names (without extension)
+    params [list]: list of parameter keywords as defined in JSON_FIELDS
+    metadata_path [string]: path to folder with detector metadata jsons
+    cache_path [string]: path to the cache file (default see cache_file())
+    where [string|list]: filter, see parse_where()
+    '''
+    rows = refresh_cache(metadata_path, cache_path)
+    if where is not None:
+        det_list = filter_rows(rows, det_list, parse_where(where))
+
+    col = {c: i for i, c in enumerate(CACHE_COLUMNS)}
     res = {'det_name': det_list}
     res['order'] = [int(x[1:3]) for x in det_list]
-    for p in params: res[p] = []
+    for p in params:
+        res[p] = [rows[det][col[p]] for det in det_list]
+
+    with profiling.stage('DataFrame construction'):
+        df = typed_table(pd.DataFrame(res))
+
+    return df
+
+
+def update_cache(metadata_path=METADATA_PATH, cache_path=None):
+    '''
+    (string, string) -> pd.DataFrame
+
+    Load the column cache of all JSON_FIELDS values and refresh it incrementally (see refresh_cache()),
+    return it as DataFrame indexed by detector name
+
+    metadata_path [string]: path to folder with detector metadata jsons
+    cache_path [string]: path to the cache file (default see cache_file())
+
+    >>> update_cache('legend-detectors/germanium/detectors/')
+              date    mass  ...  mtime_ns   size                                      hash
+    B00000A   ...
+    '''
+    rows = refresh_cache(metadata_path, cache_path)
+    cache = pd.DataFrame.from_dict(rows, orient='index', columns=CACHE_COLUMNS)
+    if len(rows) == 0: cache = pd.DataFrame(columns=CACHE_COLUMNS)
+
+    return cache.sort_index()
+
+
+def refresh_cache(metadata_path=METADATA_PATH, cache_path=None):
+    '''
+    (string, string) -> dict
+
+    Load the column cache and refresh it incrementally: only jsons that were added or changed
+    (by mtime, size and content hash) are parsed, deleted ones are dropped.
+    The cache is written back only if something changed. Plain python, pandas is not needed.
+
+    metadata_path [string]: path to folder with detector metadata jsons
+    cache_path [string]: path to the cache file (default see cache_file())
+
+    Return dict detector name -> list of values in order of CACHE_COLUMNS; if the cache cannot be written
+    (e.g. read-only cache folder) the values are returned anyway
+    '''
+    if is_snapshot(metadata_path):
+        # snapshot is a column store already, no cache file
+        snap = get_snapshot(metadata_path)
+        cols = [snap.column(p) for p in JSON_FIELDS]
+        return {det: [col[i] for col in cols] + [snap.mtime_ns, None, None] for i, det in enumerate(snap.names)}
+
+    if cache_path is None:
+        cache_path = cache_file(metadata_path)
+
+    cached = {}
+    if os.path.exists(cache_path):
+        try:
+            cache = load_json(cache_path)
+        except (OSError, ValueError):
+            # unreadable
+            cache = {}
+        # cache written with a different JSON_FIELDS definition or format -> start over
+        if isinstance(cache, dict) and cache.get('version') == CACHE_VERSION and cache.get('columns') == CACHE_COLUMNS\
+            and isinstance(cache.get('rows'), dict):
+            cached = cache['rows']
+    n_fields = len(JSON_FIELDS)
+
+    # rows of the refreshed cache, reusing unchanged ones
+    rows = {}
+    changed = False
+    for entry in os.scandir(metadata_path):
+        if not entry.name.endswith('.json'):
+            continue
+        det = entry.name[:-len('.json')]
+        st = entry.stat()
+        old = cached.get(det)
+        # same mtime and size -> assume unchanged without reading the file
+        if old is not None and old[n_fields] == st.st_mtime_ns and old[n_fields+1] == st.st_size:
+            rows[det] = old
+            continue
+
+        with open(entry.path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        changed = True
+        if old is not None and old[n_fields+2] == digest:
+            # only touched, content is the same
+            rows[det] = old[:n_fields] + [st.st_mtime_ns, st.st_size, digest]
+            continue
+
+        js = loads_json(raw, lazy=True)
+        rows[det] = extract_fields(js) + [st.st_mtime_ns, st.st_size, digest]
+        del js # on-demand document has to be released before the parser is reused
+
+    # deleted jsons
+    if len(set(cached) - set(rows)) > 0:
+        changed = True
+
+    if changed:
+        # written next to the cache and renamed, concurrent readers never see a partial file
+        tmp = '{}.{}-{}.tmp'.format(cache_path, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(dumps_json({'version': CACHE_VERSION, 'columns': CACHE_COLUMNS, 'rows': rows}))
+            os.replace(tmp, cache_path)
+        except OSError:
+            # cannot write the cache -> answer without it, parsed again next time
+            if os.path.exists(tmp): os.remove(tmp)
+
+    return rows
+
+
+def cache_file(metadata_path=METADATA_PATH):
+    '''
+    (string) -> string
+
+    Return the default column cache file of a metadata folder: in CACHE_DIR, named after the folder and a hash of its absolute path
+
+    >>> cache_file('legend-detectors/germanium/diodes/')
+    '/home/user/.cache/detector_info/diodes-3f2a9c1b7d4e8a60.json'
+    '''
+    path = os.path.realpath(metadata_path)
+    return os.path.join(CACHE_DIR, '{}-{}.json'.format(os.path.basename(path), hashlib.sha1(path.encode()).hexdigest()[:16]))
 
+
+def cached_records(params, metadata_path=METADATA_PATH, det_type='all', max_order=10000, where=None, cache_path=None):
+    '''
+    (list, string, list, int, string|list, string) -> list
+
+    Same selection as info_table(..., cache=True), but as list of dicts (det_name, order, params) in plain python,
+    without importing pandas (fast start for command line queries); missing values are None, mass in kg
+
+    params [list]: list of parameter keywords as defined in JSON_FIELDS
+    metadata_path [string]: path to folder with detector metadata jsons
+    det_type [list|string]: detector type(s), 'all' for all types
+    max_order [int]: maximum order
+    where [string|list]: filter, see parse_where()
+    cache_path [string]: path to the cache file (default see cache_file())
+    '''
+    if det_type == 'all':
+        det_type = ['B','C','P','V']
+    elif isinstance(det_type, str):
+        det_type = [det_type]
+
+    rows = refresh_cache(metadata_path, cache_path)
+    det_list = [det for det in detector_list(metadata_path, max_order, det_type) if det in rows]
+    col = {c: i for i, c in enumerate(CACHE_COLUMNS)}
+    if where is not None:
+        det_list = filter_rows(rows, det_list, parse_where(where))
+
+    res = []
     for det in det_list:
-        # read metadata file into a dict
-        f = open(os.path.join(metadata_path, det + '.json'))
-        js = json.load(f)
-        # obtain values of given params
+        rec = {'det_name': det, 'order': int(det[1:3])}
         for p in params:
-            res[p].append(get_json_field(js, p))
+            rec[p] = rows[det][col[p]]
+        res.append(rec)
 
-        f.close()
+    return plain_records(res, params)
 
-    return pd.DataFrame(res)
+
+def json_records(params, metadata_path=METADATA_PATH, det_type='all', max_order=10000, where=None, workers=1):
+    '''
+    (list, string, list, int, string|list, int) -> list
+
+    Same as cached_records(), but the values are read from the jsons (see iter_detectors()), only the selected ones;
+    both give the values as stored in the jsons, not the float32 columns of info_table()
+
+    params [list]: list of parameter keywords as defined in JSON_FIELDS
+    metadata_path [string]: path to folder with detector metadata jsons
+    det_type [list|string]: detector type(s), 'all' for all types
+    max_order [int]: maximum order
+    where [string|list]: filter, see parse_where()
+    workers [int]: number of jsons to read concurrently
+    '''
+    if det_type == 'all':
+        det_type = ['B','C','P','V']
+    elif isinstance(det_type, str):
+        det_type = [det_type]
+
+    return plain_records(iter_detectors(params, metadata_path, det_type=det_type, max_order=max_order, workers=workers, where=where), params)
+
+
+def plain_records(records, params):
+    '''
+    (iterable, list) -> list
+
+    Return records (dicts with det_name, order and given parameters) in the units and order of info_table()
+    '''
+    res = []
+    for rec in records:
+        # g -> kg (rounded to drop float artifacts of the division)
+        if 'mass' in params and rec['mass'] is not None: rec['mass'] = round(rec['mass'] / 1000., 10)
+        res.append(rec)
+
+    # same order as info_table()
+    res.sort(key=lambda rec: (rec['order'], rec['det_name']))
+    return res
 
 
 def detector_list(metadata_path, max_order, det_type):
@@ -137,9 +1369,7 @@ def detector_list(metadata_path, max_order, det_type):
 
     '''
 
-    det_list = [x.split('.')[0] for x in os.listdir(metadata_path) if (x[0] in det_type and int(x[1:3]) <= max_order)]
-    det_list.sort()
-    return det_list
+    return get_index(metadata_path).select(det_type=det_type, max_order=max_order)
 
 
 def get_json_field(js, param):
@@ -147,20 +1377,243 @@ def get_json_field(js, param):
     (json ?, string) -> value
 
     Find field corresponding to given parameter based on JSON_FIELDS definition and return its value from given json
+    (None if missing, see missing_report() for a summary of missing values in a table)
 
     js [json?]: json ? of detector metadata format
     param [string]: parameter of interest as defined in JSON_FIELDS
     '''
+    if schema_version(js) != 'new':
+        return extract_params(js, [param])[0]
+
     # start with full dictionary and home in on the field
     ret = js
     for f in JSON_FIELDS[param]:
         if not f in ret:
-            # !! quickfix for DL check
-            print('Parameter {} not in json!'.format(param))
-            return 0
+            return None
         ret = ret[f]
 
-    return ret
+    return to_python(ret)
+
+def schema_version(js):
+    '''
+    (dict) -> string
+
+    Return 'old' for detector jsons in the old format (see old_to_new_format.py), 'migrated' for new format jsons
+    written by parse_old_to_new() (any of MIGRATED_KEYS present), 'new' otherwise (JSON_FIELDS layout)
+
+    js [dict]: detector metadata
+    '''
+    if 'det_name' in js:
+        return 'old'
+    for path in MIGRATED_KEYS:
+        node = js
+        try:
+            for f in path:
+                node = node[f]
+        except (KeyError, TypeError, IndexError):
+            continue
+        return 'migrated'
+
+    return 'new'
+
+
+# json paths and conversions of JSON_FIELDS per schema version, see field_accessors()
+ACCESSORS = {}
+
+def field_accessors(version):
+    '''
+    (string) -> dict, dict
+
+    Return json paths of the JSON_FIELDS in given schema version (see schema_version())
+    and the conversions of their values to the new format (parameter -> list of functions), compiled on first use;
+    for the old format both are derived from the migration rules (OLD_TO_NEW in old_to_new_format.py),
+    so old trees read the same values as their migration, without converting the files;
+    parameters in OLD_FIELDS are read at the old path given there, converted with the rules of its migrated path,
+    and in migrated jsons at that migrated path
+
+    version [string]: 'new', 'migrated' or 'old'
+    '''
+    if version not in ACCESSORS:
+        if version == 'new':
+            ACCESSORS[version] = (JSON_FIELDS, {})
+        elif version == 'migrated':
+            from old_to_new_format import OLD_TO_NEW_PLAN
+            from migration import target_path
+            ACCESSORS[version] = (dict(JSON_FIELDS, **{p: target_path(OLD_TO_NEW_PLAN, path) for p, path in OLD_FIELDS.items()}), {})
+        elif version == 'old':
+            from old_to_new_format import OLD_TO_NEW_PLAN
+            from migration import source_path, target_path, conversions
+            fields = {p: OLD_FIELDS.get(p) or source_path(OLD_TO_NEW_PLAN, path) for p, path in JSON_FIELDS.items()}
+            convert = {p: conversions(OLD_TO_NEW_PLAN, target_path(OLD_TO_NEW_PLAN, fields[p]) if p in OLD_FIELDS else path)\
+                for p, path in JSON_FIELDS.items()}
+            ACCESSORS[version] = (fields, {p: funcs for p, funcs in convert.items() if funcs})
+        else:
+            raise ValueError('Unknown schema version: {}'.format(version))
+
+    return ACCESSORS[version]
+
+
+def normalize_values(vals, params, version):
+    '''
+    (list, list, string) -> list
+
+    Convert values read from a json of given schema version to the new format (e.g. date DD-MM-YYYY -> YYYY-MM-DD,
+    0 -> None for missing values); values that cannot be converted are kept as they are
+    '''
+    convert = field_accessors(version)[1]
+    for i, p in enumerate(params):
+        for func in convert.get(p, ()):
+            try:
+                vals[i] = func(vals[i])
+            except (ValueError, TypeError):
+                pass
+
+    return vals
+
+
+def compile_fields(fields):
+    '''
+    (dict) -> dict
+
+    Merge json paths of given fields into a tree of nested keys, so that common prefixes are walked once;
+    leaves are lists of (column index, parameter) ending at that key
+
+    fields [dict]: parameter -> json path, e.g. JSON_FIELDS
+    '''
+    tree = {}
+    for i, p in enumerate(fields):
+        node = tree
+        for f in fields[p][:-1]:
+            node = node.setdefault(f, ({}, []))[0]
+        node.setdefault(fields[p][-1], ({}, []))[1].append((i, p))
+
+    return tree
+
+
+def extract_fields(js, tree=None, n_fields=None):
+    '''
+    (dict, dict, int) -> list
+
+    Return the values of all fields compiled into given tree from given json in one walk (None for missing)
+
+    js [dict]: detector metadata
+    tree [dict]: compiled field tree (default FIELD_TREE from JSON_FIELDS)
+    n_fields [int]: number of fields in the tree (default len(JSON_FIELDS))
+    '''
+    if tree is None:
+        if schema_version(js) != 'new':
+            return extract_params(js, list(JSON_FIELDS))
+        tree, n_fields = FIELD_TREE, len(JSON_FIELDS)
+
+    with profiling.stage('field extraction'):
+        res = [None] * n_fields
+        # walk json and tree together
+        stack = [(js, tree)]
+        while stack:
+            node, subtree = stack.pop()
+            for key, (children, leaves) in subtree.items():
+                try:
+                    val = node[key]
+                except (KeyError, TypeError, IndexError):
+                    continue
+                for i, p in leaves:
+                    res[i] = to_python(val)
+                if children:
+                    stack.append((val, children))
+
+    return res
+
+
+def json_backend():
+    '''
+    () -> string
+
+    Return the json parser used by load_json() according to JSON_BACKEND and installed packages
+    '''
+    if JSON_BACKEND != 'auto':
+        return JSON_BACKEND
+    if simdjson is not None:
+        return 'simdjson'
+    if orjson is not None:
+        return 'orjson'
+    return 'json'
+
+
+def load_json(path, lazy=False):
+    '''
+    (string, bool) -> dict
+
+    Read given json file in one call and parse it with the backend from json_backend()
+
+    path [string]: path to json file
+    lazy [bool]: allow an on-demand document (only dict-like access, values decoded when accessed,
+        use to_python() on the values); otherwise a plain dict is returned
+    '''
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    return loads_json(raw, lazy)
+
+
+def dumps_json(obj):
+    '''
+    (dict) -> bytes
+
+    Serialize plain python to compact json, with orjson if installed
+    '''
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+# one simdjson parser per thread (a parser cannot be shared between threads)
+PARSERS = threading.local()
+
+def loads_json(raw, lazy=False):
+    '''
+    (bytes, bool) -> dict
+
+    Parse json bytes with the backend from json_backend(), see load_json()
+
+    raw [bytes|memoryview]: json document
+    lazy [bool]: allow an on-demand document
+    '''
+    with profiling.stage('json parse', files=1, nbytes=len(raw)):
+        backend = json_backend()
+        if backend == 'simdjson':
+            if not hasattr(PARSERS, 'parser'):
+                PARSERS.parser = simdjson.Parser()
+            doc = PARSERS.parser.parse(bytes(raw) if isinstance(raw, memoryview) else raw)
+            return doc if lazy else to_python(doc)
+        if backend == 'orjson':
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # e.g. integers beyond 64 bit -> let json decide
+                pass
+
+        return json.loads(bytes(raw) if isinstance(raw, memoryview) else raw)
+
+
+def to_python(val):
+    '''
+    (value) -> value
+
+    Convert a value from an on-demand document to plain python (dict/list); plain values are returned as they are
+    '''
+    if simdjson is not None:
+        if isinstance(val, simdjson.Object):
+            return val.as_dict()
+        if isinstance(val, simdjson.Array):
+            return val.as_list()
+
+    return val
+
+
+# compiled once, see compile_fields()
+FIELD_TREE = compile_fields(JSON_FIELDS)
+# compiled trees for parameter lists, see extract_params()
+FIELD_TREES = {}
 
 if __name__ == '__main__':
     # lst = detector_list(METADATA_PATH, 10, ['V'])
@@ -0,0 +1,251 @@
+'''
+Declarative json schema migration: a list of rules is compiled once into a tree of per-dict plans,
+then each document is rebuilt in a single pass (every nested dict is visited and rebuilt once,
+renames / drops / conversions are dict lookups, so the cost is linear in the document size
+and does not grow with the number of rules).
+
+Rules are tuples, json paths are lists of keys as in JSON_FIELDS. The parent keys of a path
+are the names in the new format; the last key is the field name the rule applies to:
+
+    ('rename', path, new_key)           rename field in place (same position)
+    ('drop', path)                      remove field (ignored if missing)
+    ('move', path, new_path)            move field to another dict (appended; KeyError if missing)
+    ('order', dict_path, [keys])        put given keys first, in this order, the rest keeps its order
+    ('null_if_zero', path)              0 -> None
+    ('null_if_missing', path)           add field as None if missing (appended)
+    ('date', path, old_format, new_format)  reorder date, e.g. 'DD-MM-YYYY' -> 'YYYY-MM-DD', '' -> None
+    ('convert', path, func)             value -> func(value)
+
+Rules for renamed / moved fields use the new names (e.g. null_if_zero on the renamed key).
+
+>>> plan = compile_rules([('rename', ['geometry', 'bottom_cyl'], 'bottom_cylinder'), ('null_if_zero', ['production', 'enrichment'])])
+>>> migrate({'production': {'enrichment': 0}, 'geometry': {'bottom_cyl': {}}}, plan)
+{'production': {'enrichment': None}, 'geometry': {'bottom_cylinder': {}}}
+'''
+import hashlib
+import functools
+
+# -------------------------------------------------------------------------------
+
+def compile_rules(rules):
+    '''
+    (list) -> dict
+
+    Compile migration rules into a tree of plans, one per nested dict touched by the rules (see migrate())
+
+    rules [list]: rule tuples, see module docstring
+    '''
+    root = new_plan()
+    moves = []
+    for rule in rules:
+        kind, path = rule[0], list(rule[1])
+        if kind == 'order':
+            plan_node(root, path)['first'] = list(rule[2])
+            continue
+
+        node = plan_node(root, path[:-1])
+        key = path[-1]
+        if kind == 'rename':
+            node['rename'][key] = rule[2]
+        elif kind == 'drop':
+            node['drop'].add(key)
+        elif kind == 'move':
+            node['drop'].add(key)
+            moves.append((path, list(rule[2])))
+        elif kind == 'null_if_zero':
+            node['convert'].setdefault(key, []).append(null_if_zero)
+        elif kind == 'null_if_missing':
+            node['default'][key] = None
+        elif kind == 'date':
+            node['convert'].setdefault(key, []).append(functools.partial(reformat_date, old=rule[2], new=rule[3]))
+        elif kind == 'convert':
+            node['convert'].setdefault(key, []).append(rule[2])
+        else:
+            raise ValueError('Unknown migration rule: {}'.format(kind))
+
+    ## moved values are read from the source document -> parent path in the old names
+    for path, new_path in moves:
+        plan_node(root, new_path[:-1])['move_in'].append((new_path[-1], old_path(root, path[:-1]) + path[-1:]))
+
+    return root
+
+
+def new_plan():
+    ''' () -> dict: empty plan of one dict '''
+    return {'rename': {}, 'drop': set(), 'convert': {}, 'default': {}, 'move_in': [], 'first': [], 'children': {}}
+
+# plan of dicts without rules (not to be modified)
+EMPTY_PLAN = new_plan()
+
+
+def plan_node(root, path):
+    '''
+    (dict, list) -> dict
+
+    Return plan for the dict at given path (new names), created if needed
+    '''
+    node = root
+    for key in path:
+        node = node['children'].setdefault(key, new_plan())
+    return node
+
+
+def old_path(root, path):
+    '''
+    (dict, list) -> list
+
+    Translate path in the new names to the old names using the renames of the plan
+    '''
+    res = []
+    node = root
+    for key in path:
+        old = {new: old for old, new in node['rename'].items()}
+        res.append(old.get(key, key))
+        node = node['children'].get(key, EMPTY_PLAN)
+    return res
+
+
+def migrate(dct, plan, root=None):
+    '''
+    (dict, dict, dict) -> dict
+
+    Return new document with the compiled rules applied, given document is not modified
+    (dicts not touched by any rule are shared, not copied)
+
+    dct [dict]: document (or nested dict) to migrate
+    plan [dict|list]: plan from compile_rules() (or list of rules, compiled on every call)
+    root [dict]: full document, source of moved fields (default dct)
+    '''
+    if isinstance(plan, list):
+        plan = compile_rules(plan)
+    if root is None:
+        root = dct
+
+    rename, drop, convert, children = plan['rename'], plan['drop'], plan['convert'], plan['children']
+    res = {}
+    for key, val in dct.items():
+        if key in drop:
+            continue
+        key = rename.get(key, key)
+        if key in children and isinstance(val, dict):
+            val = migrate(val, children[key], root)
+        for func in convert.get(key, ()):
+            val = func(val)
+        res[key] = val
+
+    for key, path in plan['move_in']:
+        val = root
+        for f in path:
+            val = val[f]
+        if key in children and isinstance(val, dict):
+            val = migrate(val, children[key], root)
+        for func in convert.get(key, ()):
+            val = func(val)
+        res[key] = val
+
+    for key, val in plan['default'].items():
+        res.setdefault(key, val)
+
+    if plan['first']:
+        first = [key for key in plan['first'] if key in res]
+        res = {**{key: res[key] for key in first}, **res}
+
+    return res
+
+def source_path(plan, path):
+    '''
+    (dict, list) -> list
+
+    Return the json path in the old format of a field at given path in the new format (inverse of the renames and moves),
+    e.g. to read old documents without migrating them (see field_accessors() in info_table.py)
+
+    plan [dict]: plan from compile_rules()
+    path [list]: json path in the new format
+    '''
+    res = []
+    node = plan
+    for key in path:
+        moved = dict(node['move_in']).get(key)
+        if moved is not None:
+            res = list(moved)
+        else:
+            old = {new: old for old, new in node['rename'].items()}
+            res.append(old.get(key, key))
+        node = node['children'].get(key, EMPTY_PLAN)
+    return res
+
+
+def target_path(plan, path):
+    '''
+    (dict, list) -> list
+
+    Return the json path in the new format of a field at given path in the old format (renames applied,
+    inverse of source_path() for fields that are not moved)
+
+    plan [dict]: plan from compile_rules()
+    path [list]: json path in the old format
+    '''
+    res = []
+    node = plan
+    for key in path:
+        key = node['rename'].get(key, key)
+        res.append(key)
+        node = node['children'].get(key, EMPTY_PLAN)
+    return res
+
+
+def conversions(plan, path):
+    '''
+    (dict, list) -> list
+
+    Return value conversions (null_if_zero, date, convert rules) of the field at given path in the new format
+    '''
+    node = plan
+    for key in path[:-1]:
+        node = node['children'].get(key, EMPTY_PLAN)
+    return list(node['convert'].get(path[-1], []))
+
+
+def rules_version(rules):
+    '''
+    (list) -> string
+
+    Return short hash of given rules, changes whenever a rule is added, removed or edited
+    (functions of convert rules are identified by module and name)
+    '''
+    def key(x):
+        if callable(x):
+            return '{}.{}'.format(getattr(x, '__module__', ''), getattr(x, '__qualname__', repr(x)))
+        if isinstance(x, (list, tuple)):
+            return [key(y) for y in x]
+        return x
+
+    return hashlib.sha1(repr(key(rules)).encode()).hexdigest()[:12]
+
+# -------------------------------------------------------------------------------
+# value conversions
+# -------------------------------------------------------------------------------
+
+def null_if_zero(val):
+    ''' missing values are written as null '''
+    return None if val == 0 else val
+
+
+def reformat_date(val, old='DD-MM-YYYY', new='YYYY-MM-DD', sep='-'):
+    '''
+    (string, string, string, string) -> string
+
+    Reorder date fields, e.g. '24-03-2021' -> '2021-03-24'; '' and None -> None
+
+    val [string]: date
+    old [string]: format of given date, fields separated by sep
+    new [string]: format of returned date
+    '''
+    if val is None or val == '':
+        return None
+    keys, vals = old.split(sep), val.split(sep)
+    if len(keys) != len(vals):
+        raise ValueError('Date {} does not match format {}'.format(val, old))
+    fields = dict(zip(keys, vals))
+    return sep.join(fields[f] for f in new.split(sep))
+
@@ -1,243 +1,390 @@
 import os
 import json
-from collections import OrderedDict
+import hashlib
 import pprint
-import numpy as np
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from info_table import load_json, loads_json, get_catalog, pd
+from migration import compile_rules, migrate, rules_version
 
 METADATA_PATH = "/home/sagitta/_legend/detectors/legend-detectors/germanium/detectors/"
 TEST_PATH = 'new_format/'
+# manifest of the last migration into an output folder, see parse_old_to_new()
+MANIFEST_NAME = '.migration_manifest.json'
 
-def parse_old_to_new(metadata_path=METADATA_PATH):
-    det_list = detector_list(metadata_path)
+def parse_old_to_new(metadata_path=METADATA_PATH, output_path=TEST_PATH, workers=1, dry_run=False, force=False):
+    '''
+    (string, string, int, bool, bool) -> pd.DataFrame
 
-    # some dets have non-zero dl saved under geometry -> save for later since the field will be removed
-    dct_dl = {'det_name': [], 'dl_thickness_in_mm': []}
-
-    for det in det_list:
-        # print('--------', det)
-        js = get_dict(det)
-        # f = open(os.path.join(metadata_path, det+'.json'))
-        # js = order_dict(json.load(f))
-        # js = MyOrderedDict(json.load(f))
-        # pprint.pprint(js, indent=1)
-        # return
-
-        ## remove char data path and ELOG URL
-        js['characterization']['l200_site'].pop('data')
-        js['characterization']['l200_site'].pop('elog')
-
-        ## rename "det_name" to "name"
-        js.rename('det_name', 'name')
-        js.move_to_end('name', last=False)
-        # sanity check
-        if js['name'] != det:
-            print('Detector json field name ({}) is not the same as filename ({})!'.format(js['name'], det))
-            return
-
-        ## descriptive names
-        js['geometry'].rename('bottom_cyl', 'bottom_cylinder')
-        # !! not sure still if this will move under char/l200_site
-        js['production'].rename('dep_voltage_in_V', 'depletion_voltage_in_V')
-        js['production'].rename('rec_voltage_in_V', 'recommended_voltage_in_V')
-        js['characterization']['manufacturer'].rename('dep_voltage_in_V', 'depletion_voltage_in_V')
-        # change opV to recV to follow the same format as L200 result
-        js['characterization']['manufacturer'].rename('op_voltage_in_V', 'recommended_voltage_in_V')
-        js['characterization']['l200_site'].rename('res', 'fwhm')
-        js['characterization']['l200_site'].rename('sf', 'survival_fraction')
-
-        js['characterization']['manufacturer'].rename('57co_fep_res_in_keV', 'fwhm_co57fep_in_keV')
-        js['characterization']['manufacturer'].rename('60co_fep_res_in_keV', 'fwhm_co60fep_in_keV')
-
-        ## move mass from "geometry" to "production"
-        js['production']['mass_in_g'] = js['geometry']['mass_in_g']
-        del js['geometry']['mass_in_g']
-        # move mass to be after "reprocessing"
-        js['production'].move_to_end('mass_in_g', last=False)
-        for key in ['reprocessing', 'enrichment', 'slice', 'crystal', 'serialno', 'order', 'manufacturer']:
-            js['production'].move_to_end(key, last=False)
-
-        ## remove dead layer from "geometry" -> wait, some are non-zero!? -> for BEGes only
-        dl = 'dl_thickness_in_mm'
-        # some dets don't have this field
-        if dl in js['geometry']:
-            # check if non-zero to save for later
-            if js['geometry'][dl] > 0:
-                dct_dl['det_name'].append(det)
-                dct_dl[dl].append(js['geometry'][dl])
-            # remove
-            del js['geometry'][dl]
-        else:
-            print('{} missing dl field'.format(det))
+    Convert all detector jsons from the old to the new format; problems are collected per file instead of stopping the run
+    (files with errors are not written)
+
+    Incremental: MANIFEST_NAME in output_path maps each source (content hash) and the RULES_VERSION to its output,
+    detectors with unchanged source and rules are skipped, outputs of removed sources and of sources that now have errors
+    are deleted (also with force or other rules), and files whose content would not change are not rewritten (mtimes are kept)
 
-        ## date format from DD-MM-YYYY to YYYY-MM-DD
-        # some detectors had "" in the "delivered" field -> missing info should be listed as null
-        if js['production']['delivered'] == '':
-            js['production']['delivered'] = None # will convert to null when written
+    metadata_path [string]: path to folder with old format detector jsons
+    output_path [string]: output folder, jsons are written to output_path/detectors/
+    workers [int]: number of processes converting files (1 = convert here one by one)
+    dry_run [bool]: convert and check, but do not write or delete anything
+    force [bool]: convert all detectors (the manifest is only used to remove outputs)
+
+    Return report with one row per problem: det_name, level ('error' or 'warning'), message
+
+    >>> parse_old_to_new(workers=8, dry_run=True)
+    V05261A warning: enrichment info is missing!
+    ...
+    301 detectors: 298 converted, 0 unchanged, 3 with errors, 57 warnings, 0 removed (dry run, nothing written)
+    '''
+    out_dir = os.path.join(output_path, 'detectors')
+    if not dry_run:
+        os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(output_path)
+    # entries of other rules are converted again, as all with force
+    current = {} if force else {det: entry for det, entry in manifest.items() if entry.get('rules') == RULES_VERSION}
+    outputs = set(os.listdir(out_dir)) if os.path.isdir(out_dir) else set()
+
+    ## skip sources with same mtime, size and rules as in the manifest without reading them
+    results, todo = [], []
+    for entry in sorted(os.scandir(metadata_path), key=lambda e: e.name):
+        if not entry.name.endswith('.json'):
+            continue
+        det = entry.name[:-len('.json')]
+        st = entry.stat()
+        old = current.get(det)
+        if old is not None and old['output'] in outputs and old['mtime_ns'] == st.st_mtime_ns and old['size'] == st.st_size:
+            results.append(skipped_file(det, old))
         else:
-            dd, mm, yyyy = js['production']['delivered'].split('-')
-            js['production']['delivered'] = '-'.join([yyyy,mm,dd])
-
-        ## missing values as null
-
-        if js['production']['enrichment'] == 0:
-            print('{} enrichment info is missing!'.format(det))
-            js['production']['enrichment'] = None
-
-        if js['production']['depletion_voltage_in_V'] == 0:
-            print('{} char site depV info is missing!'.format(det))
-            js['production']['depletion_voltage_in_V'] = None
-
-        for v in ['depletion_voltage_in_V', 'recommended_voltage_in_V']:
-            if js['characterization']['manufacturer'][v] == 0:
-                print('Detector {} has no {} info from vendor'.format(det, v))
-                if 'rec' in v:
-                    print("Some vendors do not give depV, but must have recV!")
-                    return
-                js['characterization']['manufacturer'][v] = None
-
-        for src in ['fwhm_co57fep_in_keV', 'fwhm_co60fep_in_keV']:
-            if js['characterization']['manufacturer'][src] == 0:
-                js['characterization']['manufacturer'][src] = None
-
-        for src in ['cofep_in_keV', 'tlfep_in_keV', 'qbb_in_keV']:
-            # some detectors have missing FWHM @ Qbb
-            if ( not src in js['characterization']['l200_site']['fwhm'] ) or ( js['characterization']['l200_site']['fwhm'][src] == 0 ):
-                js['characterization']['l200_site']['fwhm'][src] = None
-
-        for src in ['tldep_in_pc', 'qbb_in_pc', 'tlsep_in_pc', 'tlfep_in_pc']:
-            if js['characterization']['l200_site']['survival_fraction'][src] == 0:
-                js['characterization']['l200_site']['survival_fraction'][src] = None
-
-        # pprint.pprint(js, indent=1)
-        # return
-
-        with open(os.path.join(TEST_PATH, 'detectors', det+'.json'), 'w', encoding='utf-8') as f:
-            json.dump(js, f, ensure_ascii=False, indent=2)
-        
-        # if det[0] not in ['B', 'C', 'P']: return
-
-    ## save the removed non-zero dl info
-    df_dl = pd.DataFrame(dct_dl)
-    df_dl.to_csv(dl + '.csv', index=False, header=True)
-    print('Dl info from geometry is saved to' + dl + '.csv')
-
-
-def crystal_json():
-    ## for now just start with ICPCs, because I have impurity information for them, and in general vendor documents
-    # list of ICPC
-    det_list = detector_list()
-    icpc_list = [x for x in det_list if x[0] == 'V']
-
-    # collect unique crystal names, keep detectors as reference for serialno etc
-    crystals = {}
-    for det in icpc_list:
-        cryst = det[3:6]
-        if not cryst in crystals:
-            crystals[cryst] = []
-        crystals[cryst].append(det)
-
-    # pprint.pprint(crystals)
-
-    for cry in crystals:
-        print('----- ' + cry)
-        dct = OrderedDict({})
-        dct['name'] = cry
-
-        ## serialno
-        # get serialno from detectors
-        serialno = []; order = []; enr = []
-        for det in crystals[cry]:
-            # detector serialno (usually contains slice A/B at the end, V10 does not)
-            det_js = get_dict(det)
-            det_serialno = det_js['production']['serialno']
-            cry_serialno = det_serialno[:-1] if det_serialno[-1] in ['A', 'B'] else det_serialno
-            serialno.append(cry_serialno)
-            enr.append(det_js['production']['enrichment'])
-            order.append(det[:3])
-
-        serialno = np.unique(serialno)
-        order = np.unique(order)
-        enr = np.unique(enr)
-        # sanity check: should be unique -> passed sanity check after some corrections of detector jsons with wrong serialno
-        # print(crystals[cry])
-        # print(serialno)
-        # if len(serialno) > 1:
-            # print ('More than one serialno for detectors based on same crystal!')
-            # return
-        if len(enr) > 1:
-            print('More than one enrichment for detectors based on the same crystal!')
-
-        dct['serialno'] = serialno[0]
-
-        ## enrichment
-        # no info for ICPC, yes for other types
-        dct['enrichment'] = None if enr[0] == 0 else enr[0]
-
-        ## detector Z=0 position in crystal
-        # crystal is shaved, so there is offset, not just slice A + slice B = crystal
-        # check David Radford's config files to figure it all out
-
-        ## impurity measurements: done once
-        # !! BE CAREFUL DO NOT OVERWRITE PAINSTAKING MANUAL IMPURITY INPUTS
-        # create template, have to fill by hand from spreadsheets
-        # dct['impurity_measurements'] = OrderedDict({})
-        # dct['impurity_measurements']['value_in_1e9e_cm3'] = []
-        # dct['impurity_measurements']['distance_from_seed_end_mm'] = []
-
-        ## impurity profile
-        dct['final_impurity_curve'] = OrderedDict({})
-        funcs = {
-            'polynomial': ['a0', 'a1', 'a2'],
-            'empirical': ['a', 'b', 'c', 'tau']
-        }
-        for f in funcs:
-            dct['final_impurity_curve'][f] = OrderedDict({})
-            for param in funcs[f]:
-                dct['final_impurity_curve'][f][param] = None
+            todo.append((det, old if old is not None and old['output'] in outputs else None))
+
+    n = len(todo)
+    dets, olds = [t[0] for t in todo], [t[1] for t in todo]
+    if workers > 1 and n > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results += list(ex.map(migrate_file, dets, [metadata_path]*n, [output_path]*n, [dry_run]*n, olds, chunksize=max(1, n // (4*workers))))
+    else:
+        results += [migrate_file(det, metadata_path, output_path, dry_run, old) for det, old in todo]
+    results.sort(key=lambda res: res['det_name'])
+
+    ## outputs of removed sources and of sources that cannot be converted any more
+    # from the whole manifest (any rules) and the jsons in out_dir, not only the entries used for skipping
+    owners = {entry['output']: det for det, entry in manifest.items()}
+    owners.update({out: out[:-len('.json')] for out in outputs if out.endswith('.json') and out not in owners})
+    kept = set(res['entry']['output'] for res in results if res['entry'] is not None)
+    converted = set(res['det_name'] for res in results)
+    removed = sorted(out for out in owners if out not in kept)
+    for out in removed:
+        det = owners[out]
+        if det in converted:
+            print('{} has errors, its old output {} is removed'.format(det, out))
+        else:
+            print('{} removed from {}'.format(det, metadata_path))
+        if not dry_run and out in outputs:
+            os.remove(os.path.join(out_dir, out))
 
-        ## save file
-        with open(os.path.join(TEST_PATH, 'crystals', order[0] + cry+'.json'), 'w', encoding='utf-8') as f:
-            json.dump(dct, f, ensure_ascii=False, indent=2)
+    ## report
+    report = {'det_name': [], 'level': [], 'message': []}
+    # some dets have non-zero dl saved under geometry -> save for later since the field will be removed
+    dl = 'dl_thickness_in_mm'
+    dct_dl = {'det_name': [], dl: []}
+    new_manifest = {}
+    for res in results:
+        for level in ['error', 'warning']:
+            for msg in res[level + 's']:
+                report['det_name'].append(res['det_name'])
+                report['level'].append(level)
+                report['message'].append(msg)
+                print('{} {}: {}'.format(res['det_name'], level, msg))
+        if res['dl'] is not None:
+            dct_dl['det_name'].append(res['det_name'])
+            dct_dl[dl].append(res['dl'])
+        # files with errors are not in the manifest -> tried again next time
+        if res['entry'] is not None:
+            new_manifest[res['det_name']] = res['entry']
+    report = pd.DataFrame(report)
+
+    n_err = len(set(report.loc[report['level'] == 'error', 'det_name']))
+    n_skip = sum(res['skipped'] for res in results)
+    print('{} detectors: {} converted, {} unchanged, {} with errors, {} warnings, {} removed{}'.format(len(results), len(results) - n_skip - n_err,\
+        n_skip, n_err, (report['level'] == 'warning').sum(), len(removed), ' (dry run, nothing written)' if dry_run else ''))
+
+    if not dry_run:
+        ## save the removed non-zero dl info
+        df_dl = pd.DataFrame(dct_dl)
+        if write_if_changed(os.path.join(output_path, dl + '.csv'), df_dl.to_csv(index=False, header=True)):
+            print('Dl info from geometry is saved to ' + os.path.join(output_path, dl + '.csv'))
+        if new_manifest != manifest:
+            save_manifest(output_path, new_manifest)
+
+    return report
+
+
+def migrate_file(det, metadata_path=METADATA_PATH, output_path=TEST_PATH, dry_run=False, old=None):
+    '''
+    (string, string, string, bool, dict) -> dict
 
+    Convert one detector json to the new format and write it unless there are errors or dry_run;
+    if source content and rules are the same as in given manifest entry the conversion is skipped,
+    the output file is rewritten only if its content changes
 
+    old [dict]: manifest entry of the detector from the last run (None = convert)
 
+    Return dict with det_name, errors [list], warnings [list], dl (non-zero dead layer removed from geometry or None),
+    written [bool], skipped [bool], entry (manifest entry, None if there were errors)
+    '''
+    path = os.path.join(metadata_path, det+'.json')
+    st = os.stat(path)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha1(raw).hexdigest()
 
+    # only touched, content is the same
+    if old is not None and old['source_hash'] == digest and old['rules'] == RULES_VERSION:
+        return skipped_file(det, dict(old, mtime_ns=st.st_mtime_ns, size=st.st_size))
 
-    # print(crystals)
+    res = {'det_name': det, 'errors': [], 'warnings': [], 'dl': None, 'written': False, 'skipped': False, 'entry': None}
+    try:
+        js = convert_detector(loads_json(raw), det, res)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        # unexpected structure of the old json
+        res['errors'].append('{}: {}'.format(type(e).__name__, e))
+        return res
 
-# --------------------------------
+    if len(res['errors']) == 0:
+        res['entry'] = {'source_hash': digest, 'rules': RULES_VERSION, 'mtime_ns': st.st_mtime_ns, 'size': st.st_size,\
+            'output': det+'.json', 'dl': res['dl'], 'warnings': res['warnings']}
+        if not dry_run:
+            res['written'] = write_if_changed(os.path.join(output_path, 'detectors', det+'.json'), json.dumps(js, ensure_ascii=False, indent=2))
 
-class MyOrderedDict(OrderedDict):
+    return res
 
-    # def rename(self, key_old, key_new):
-    #     self[key_new] = self.pop(key_old)
-    #     # self[key_new] = self[key_old]
-    #     # del self[key_old]
 
-    def rename(self, key_old, key_new):
-        for _ in range(len(self)):
-            k, v = self.popitem(False)
-            self[key_new if key_old == k else k] = v
+def skipped_file(det, entry):
+    ''' (string, dict) -> dict: migrate_file() result of an unchanged detector from its manifest entry '''
+    return {'det_name': det, 'errors': [], 'warnings': list(entry['warnings']), 'dl': entry['dl'], 'written': False, 'skipped': True, 'entry': entry}
 
-# --------------------------------
-# helper functions
-# --------------------------------
 
-def order_dict(dct):
-    ''' make nested OrderedDict '''
+def write_if_changed(path, text):
+    '''
+    (string, string) -> bool
 
-    for key in dct:
-        if type(dct[key]) == dict:
-            dct[key] = order_dict(dct[key])
+    Write text to given file only if its content differs (keeps the mtime of unchanged outputs); return True if written
+    '''
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            if f.read() == text:
+                return False
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return True
 
-    return MyOrderedDict(dct)
 
+def load_manifest(output_path=TEST_PATH):
+    '''
+    (string) -> dict
+
+    Return manifest entries detector name -> dict (source_hash, rules, mtime_ns, size, output, dl, warnings)
+    of the last migration into output_path, whatever their rules (entries of other rules are not skipped,
+    but their outputs are still removed with their sources, see parse_old_to_new())
+    '''
+    path = os.path.join(output_path, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            files = json.load(f)['files']
+    except (ValueError, KeyError):
+        # unreadable -> convert everything
+        return {}
+
+    return files
+
+
+def save_manifest(output_path, files):
+    ''' (string, dict) -> None: write manifest entries (see load_manifest()) '''
+    with open(os.path.join(output_path, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'rules': RULES_VERSION, 'files': files}, f, indent=1, sort_keys=True)
+
+
+# old -> new format, see migration.py; parents in the new names
+OLD_TO_NEW = [
+    ## remove char data path and ELOG URL
+    ('drop', ['characterization', 'l200_site', 'data']),
+    ('drop', ['characterization', 'l200_site', 'elog']),
+
+    ## rename "det_name" to "name", first field
+    ('rename', ['det_name'], 'name'),
+    ('order', [], ['name']),
+
+    ## descriptive names
+    ('rename', ['geometry', 'bottom_cyl'], 'bottom_cylinder'),
+    # !! not sure still if this will move under char/l200_site
+    ('rename', ['production', 'dep_voltage_in_V'], 'depletion_voltage_in_V'),
+    ('rename', ['production', 'rec_voltage_in_V'], 'recommended_voltage_in_V'),
+    ('rename', ['characterization', 'manufacturer', 'dep_voltage_in_V'], 'depletion_voltage_in_V'),
+    # change opV to recV to follow the same format as L200 result
+    ('rename', ['characterization', 'manufacturer', 'op_voltage_in_V'], 'recommended_voltage_in_V'),
+    ('rename', ['characterization', 'l200_site', 'res'], 'fwhm'),
+    ('rename', ['characterization', 'l200_site', 'sf'], 'survival_fraction'),
+    ('rename', ['characterization', 'manufacturer', '57co_fep_res_in_keV'], 'fwhm_co57fep_in_keV'),
+    ('rename', ['characterization', 'manufacturer', '60co_fep_res_in_keV'], 'fwhm_co60fep_in_keV'),
+
+    ## move mass from "geometry" to "production", after "reprocessing"
+    ('move', ['geometry', 'mass_in_g'], ['production', 'mass_in_g']),
+    ('order', ['production'], ['manufacturer', 'order', 'serialno', 'crystal', 'slice', 'enrichment', 'reprocessing', 'mass_in_g']),
+
+    ## remove dead layer from "geometry" -> wait, some are non-zero!? -> for BEGes only (saved in convert_detector())
+    ('drop', ['geometry', 'dl_thickness_in_mm']),
+
+    ## date format from DD-MM-YYYY to YYYY-MM-DD
+    # some detectors had "" in the "delivered" field -> missing info should be listed as null
+    ('date', ['production', 'delivered'], 'DD-MM-YYYY', 'YYYY-MM-DD'),
+
+    ## missing values as null
+    ('null_if_zero', ['production', 'enrichment']),
+    ('null_if_zero', ['production', 'depletion_voltage_in_V']),
+] + [
+    ('null_if_zero', ['characterization', 'manufacturer', src]) for src in
+        ['depletion_voltage_in_V', 'recommended_voltage_in_V', 'fwhm_co57fep_in_keV', 'fwhm_co60fep_in_keV']
+] + [
+    # some detectors have missing FWHM @ Qbb
+    rule for src in ['cofep_in_keV', 'tlfep_in_keV', 'qbb_in_keV'] for rule in
+        [('null_if_zero', ['characterization', 'l200_site', 'fwhm', src]), ('null_if_missing', ['characterization', 'l200_site', 'fwhm', src])]
+] + [
+    ('null_if_zero', ['characterization', 'l200_site', 'survival_fraction', src]) for src in ['tldep_in_pc', 'qbb_in_pc', 'tlsep_in_pc', 'tlfep_in_pc']
+]
+
+OLD_TO_NEW_PLAN = compile_rules(OLD_TO_NEW)
+# outputs converted with another version are converted again; bump when convert_detector() changes
+RULES_VERSION = '1-' + rules_version(OLD_TO_NEW)
+
+
+def convert_detector(js, det, res):
+    '''
+    (dict, string, dict) -> dict
+
+    Convert detector metadata from the old to the new format with the OLD_TO_NEW rules;
+    problems are appended to res['errors'] / res['warnings'], non-zero dead layer from geometry saved in res['dl']
+    '''
+    ## checks on the old format before conversion
+    # sanity check
+    if js['det_name'] != det:
+        res['errors'].append('Detector json field name ({}) is not the same as filename ({})!'.format(js['det_name'], det))
+
+    dl = 'dl_thickness_in_mm'
+    # some dets don't have this field
+    if dl in js['geometry']:
+        # check if non-zero to save for later
+        if js['geometry'][dl] > 0:
+            res['dl'] = js['geometry'][dl]
+    else:
+        res['warnings'].append('missing dl field')
+
+    if js['production']['enrichment'] == 0:
+        res['warnings'].append('enrichment info is missing!')
+    if js['production']['dep_voltage_in_V'] == 0:
+        res['warnings'].append('char site depV info is missing!')
+
+    for v, old in [('depletion_voltage_in_V', 'dep_voltage_in_V'), ('recommended_voltage_in_V', 'op_voltage_in_V')]:
+        if js['characterization']['manufacturer'][old] == 0:
+            if 'rec' in v:
+                res['errors'].append('no {} info from vendor: some vendors do not give depV, but must have recV!'.format(v))
+            else:
+                res['warnings'].append('no {} info from vendor'.format(v))
+
+    return migrate(js, OLD_TO_NEW_PLAN)
+
+
+def crystal_json(metadata_path=METADATA_PATH, output_path=TEST_PATH, det_type='all', df=None):
+    '''
+    (string, string, list, pd.DataFrame) -> pd.DataFrame
+
+    Write a crystal json for each crystal (detectors with the same type, order and crystal code, e.g. V00048A/B -> V00048.json)
+    with serialno and enrichment taken from its detectors; values are aggregated in one groupby over the detector catalog
+
+    metadata_path [string]: path to folder with detector metadata jsons
+    output_path [string]: output folder, jsons are written to output_path/crystals/
+    det_type [list|string]: detector types, V=ICPC, B=BEGe, P=PPC, C=Coax, 'all' for all types
+    df [pd.DataFrame]: detector table indexed by detector name with columns serialno and enr
+        (default the shared catalog of metadata_path, see get_catalog())
+
+    Return conflicts: crystal, field, values for crystals whose detectors disagree (the smallest value is written)
+
+    >>> crystal_json(det_type=['V'])
+    More than one enrichment for detectors based on the same crystal:
+    ...
+    59 crystal jsons in new_format/crystals/ (59 written)
+    '''
+    if df is None:
+        df = get_catalog(metadata_path).table
+    if det_type == 'all':
+        det_type = ['B','C','P','V']
+    elif isinstance(det_type, str):
+        det_type = [det_type]
+
+    names = df.index[df.index.str[0].isin(det_type)]
+    det = pd.DataFrame({
+        'crystal': names.str[:6],
+        # detector serialno (usually contains slice A/B at the end, V10 does not)
+        'serialno': df.loc[names, 'serialno'].astype(object).str.replace(r'[AB]$', '', regex=True).to_numpy(),
+        'enrichment': df.loc[names, 'enr'].astype(float).to_numpy(),
+    })
+    groups = det.groupby('crystal', sort=True)
+    crystals = groups[['serialno', 'enrichment']].min()
+
+    ## sanity check: should be unique -> passed for serialno after some corrections of detector jsons with wrong serialno
+    n_unique = groups[['serialno', 'enrichment']].nunique()
+    conflicts = {'crystal': [], 'field': [], 'values': []}
+    for field in ['serialno', 'enrichment']:
+        bad = n_unique.index[n_unique[field] > 1]
+        if len(bad) == 0:
+            continue
+        values = groups[field].unique()
+        conflicts['crystal'] += list(bad)
+        conflicts['field'] += [field] * len(bad)
+        conflicts['values'] += [sorted(values[cry]) for cry in bad]
+    conflicts = pd.DataFrame(conflicts)
+    for field, rows in conflicts.groupby('field', sort=False):
+        print('More than one {} for detectors based on the same crystal:'.format(field))
+        print(rows[['crystal', 'values']].to_string(index=False))
+
+    ## build all crystal jsons, then write them
+    # impurity profile
+    funcs = {
+        'polynomial': ['a0', 'a1', 'a2'],
+        'empirical': ['a', 'b', 'c', 'tau']
+    }
+    files = {}
+    for cry, serialno, enr in zip(crystals.index, crystals['serialno'], crystals['enrichment']):
+        files[cry + '.json'] = {
+            'name': cry[3:],
+            'serialno': None if pd.isna(serialno) else serialno,
+            # no info for ICPC, yes for other types
+            'enrichment': None if pd.isna(enr) or enr == 0 else float(enr),
+            ## detector Z=0 position in crystal
+            # crystal is shaved, so there is offset, not just slice A + slice B = crystal
+            # check David Radford's config files to figure it all out
+
+            ## impurity measurements: done once
+            # !! BE CAREFUL DO NOT OVERWRITE PAINSTAKING MANUAL IMPURITY INPUTS
+            # create template, have to fill by hand from spreadsheets
+            # 'impurity_measurements': {'value_in_1e9e_cm3': [], 'distance_from_seed_end_mm': []},
+            'final_impurity_curve': {f: {param: None for param in funcs[f]} for f in funcs},
+        }
+
+    out_dir = os.path.join(output_path, 'crystals')
+    os.makedirs(out_dir, exist_ok=True)
+    n_written = sum(write_if_changed(os.path.join(out_dir, name), json.dumps(dct, ensure_ascii=False, indent=2)) for name, dct in files.items())
+    print('{} crystal jsons in {} ({} written)'.format(len(files), out_dir, n_written))
+
+    return conflicts
+
+# --------------------------------
+# helper functions
+# --------------------------------
 
 def get_dict(det_name, metadata_path=METADATA_PATH):
-    f = open(os.path.join(metadata_path, det_name+'.json'))
-    # return OrderedDict(json.load(f))
-    return order_dict(json.load(f))
+    return load_json(os.path.join(metadata_path, det_name+'.json'))
 
 
 def detector_list(metadata_path=METADATA_PATH):
@@ -258,5 +405,6 @@ def detector_list(metadata_path=METADATA_PATH):
     det_list.sort()
     return det_list
 
-parse_old_to_new()
-# crystal_json()
\ No newline at end of file
+if __name__ == '__main__':
+    parse_old_to_new()
+    # crystal_json()
\ No newline at end of file
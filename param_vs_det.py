@@ -1,8 +1,12 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 # increase all font sizes
 plt.rcParams.update({'font.size': 18})
 
 from info_table import *
+import profiling
 
 # define as preferred
 # -------------------------------------------------------------------------------
@@ -53,15 +57,20 @@ COLORS = {
 
 # -------------------------------------------------------------------------------
 
-def params_vs_det(params, det_type=['V'], avg=False):
+def params_vs_det(params, det_type=['V'], avg=False, metadata_path=METADATA_PATH, df=None):
     '''
-    (list, list, bool) -> pdf image
+    (list, list, bool, string, pd.DataFrame) -> string
 
     Plot given parameters vs detector name
 
     params [list]: list of parameter keywords as defined in JSON_FIELDS in info_table.py
     det_type [list]: detector types to analyze, V=ICPC, B=BEGe, P=PPC, C=Coax (semi-coax)
     avg [bool]: plot average line for each order and total
+    metadata_path [string]: path to folder with detector metadata jsons
+    df [pd.DataFrame]: table from info_table() with given params and det_type to plot instead of reading metadata_path
+        (see params_vs_det_batch())
+
+    Return name of the saved figure
 
     >>> params_vs_det(['depV', 'depV_man'], det_type=['V'])
     --- order # 0
@@ -80,79 +89,98 @@ def params_vs_det(params, det_type=['V'], avg=False):
     '''
     ## 1. get param info
     # pandas dataframe with columns for given params for each detector of given type
-    df = info_table(params, det_type=det_type)
+    if df is None:
+        df = info_table(params, metadata_path, det_type=det_type)
     print(df)
 
-    # order index for gaps between orders of ICPC
-    # for non-ICPC since there is only one "order" will be simply a normal plot
-    order_idx = -1
-    # collect xticks to create gaps between orders
-    xticks = []
-
     fig, ax = plt.subplots(figsize=(20,8))
 
-    for order, group in df.groupby('order'):
-        print('--- order #', order)
-        order_idx += 1
-
-        # collect xticks for adding spaces between orders
-        # index is default int from 0 to N - easier for plotting thatn string det names
-        xticks += list(group.index + order_idx)
-
+    with profiling.stage('plotting'):
+        ## 2. x positions and values as arrays
+        # order index for gaps between orders of ICPC
+        # for non-ICPC since there is only one "order" will be simply a normal plot
+        orders = sorted(df['order'].unique())
+        order_idx = df['order'].map({o: i for i, o in enumerate(orders)}).to_numpy()
+        # by adding order_idx to index (element-wise) we add the gap between orders
+        # index is default int from 0 to N - easier for plotting than string det names
+        x = df.index.to_numpy() + order_idx
+        # xticks with spaces between orders (df is sorted by order)
+        xticks = list(x)
+        det_order = df['order'].to_numpy()
+
+        # remove missing values (NA) - means there is no information
+        # (a detector missing a parameter is not plotted for the following parameters either)
+        masks = {}
+        mask = np.ones(len(df), dtype=bool)
         for p in params:
-            # remove parameters that have zero value - means there is no information
-            # in the future should be set to a value like "null" to emphasize it's not actually zero
-            group = group[group[p] != 0]
-
-            if len(group) == 0:
-                print('No data for {} for order {}'.format(p, order))
-                continue
-
-            ## plot style
-            # label = '_nolegend_'
-            # default
-            label = LABELS[p] if len(params) > 1 else '_nolegend_'
-            color = None
-            # order label applies only to ICPC; order 0 = GERDA
-            if det_type == ['V']:
-                label = 'GERDA' if order == 0 else 'Order #{}{}'.format(0 if order < 10 else '', order)
-                # only want to plot label once per parameter in case of order
-                label = label if p == params[0] else '_nolegend_'
-                color = COLORS[order]
-
-            symbol = SYMBOL[p][0] if p in SYMBOL else 'o'
-            # the marker will be solid by default or if label is 'L200 measurement' (to contrast with vendor)
-            # otherwise no facecolor
+            mask = mask & df[p].notna().to_numpy()
+            masks[p] = mask
+        # number of points per order and parameter
+        counts = {p: pd.Series(masks[p]).groupby(det_order).sum() for p in params}
+
+        ## plot style per order and parameter; labels via empty lines (one per legend entry, not per detector)
+        cycle = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        colors = {}
+        for order in orders:
+            print('--- order #', order)
+            for p in params:
+                if counts[p][order] == 0:
+                    print('No data for {} for order {}'.format(p, order))
+                    continue
+
+                # default
+                label = LABELS[p] if len(params) > 1 else '_nolegend_'
+                # default color cycle, as if each order and parameter was a separate line
+                color = cycle[len(colors) % len(cycle)]
+                # order label applies only to ICPC; order 0 = GERDA
+                if det_type == ['V']:
+                    label = 'GERDA' if order == 0 else 'Order #{}{}'.format(0 if order < 10 else '', order)
+                    # only want to plot label once per parameter in case of order
+                    label = label if p == params[0] else '_nolegend_'
+                    color = COLORS[order]
+                colors[(order, p)] = color
+
+                if label != '_nolegend_':
+                    symbol, lstyle = style(p)
+                    ax.plot([], [], marker=symbol, ms=10, mfc=color, linestyle=lstyle, linewidth=1.5, c=color, label=label)
+
+        ## 3. Plot parameters: one line collection (one segment per order) and one marker collection per parameter
+        for p in params:
+            sel = masks[p]
+            if not sel.any(): continue
+            xs = x[sel]
+            ys = df[p].to_numpy(dtype=float, na_value=np.nan)[sel]
+            sel_orders = det_order[sel]
+            point_colors = [colors[(o, p)] for o in sel_orders]
+            symbol, lstyle = style(p)
+
+            # the marker will be solid (mfc=color)
             # mfc=color if not p in LABELS or LABELS[p] == 'L200 measurement' else 'none'
-            mfc=color
-            # deafult solid line, otherwise defined in SYMBOL (only marker for no line)
-            lstyle = '-'
-            if p in SYMBOL: lstyle = SYMBOL[p][1:] if len(SYMBOL[p]) > 1 else 'none'
-
-            ## 2. Plot parameters
-            # by adding order_idx to group.index (element-wise) we add the gap between orders
-            plt.plot(group.index + order_idx, group[p],\
-                    marker=symbol, ms=10, mfc=mfc,\
-                    linestyle=lstyle, linewidth=1.5,\
-                    c=color, label=label)
-
-            # 3. Plot averages if requested
+            if lstyle != 'none':
+                segments = [np.column_stack([xs[sel_orders == o], ys[sel_orders == o]]) for o in orders if (o, p) in colors]
+                ax.add_collection(LineCollection(segments, colors=[colors[(o, p)] for o in orders if (o, p) in colors],\
+                    linestyles=lstyle, linewidths=1.5))
+            ax.scatter(xs, ys, s=10**2, marker=symbol, c=point_colors, edgecolors=point_colors, linewidths=1., zorder=2.5)
+
+            # 4. Plot averages if requested
             unit = {'mass': 'kg', 'fwhm_Qbb': 'keV', 'depV': 'V'}
             if avg:
-                # average for order
-                plt.hlines(y=group[p].mean(), xmin=group.index[0]+ order_idx, xmax=group.index[-1]+ order_idx, color=color, linestyle='--', linewidth=2)
+                # average for each order, one call for all orders
+                stats = pd.DataFrame({'order': sel_orders, 'x': xs, 'y': ys}).groupby('order').agg(mean=('y', 'mean'), xmin=('x', 'min'), xmax=('x', 'max'))
+                ax.hlines(y=stats['mean'], xmin=stats['xmin'], xmax=stats['xmax'], colors=[colors[(o, p)] for o in stats.index], linestyle='--', linewidth=2)
                 if p not in unit:
-                    # will be printed before the error in next line if p not in unit
                     print('Add {} in unit dict to plot averages'.format(p))
                 # total average
-                text = '-- average: {} {}'.format(round(df[p].mean(), 2), unit[p])
+                text = '-- average: {} {}'.format(round(float(df[p].mean()), 2), unit.get(p, ''))
                 # add total if param is mass
-                if p == 'mass': text += '\ntotal: {} {}'.format(round(df[p].sum(), 2), unit[p])
+                if p == 'mass': text += '\ntotal: {} {}'.format(round(float(df[p].sum()), 2), unit[p])
                 plt.axhline(df[p].mean(), color='dimgrey', linestyle='--', linewidth=2)
-                x = 0.05; y = 0.85
-                plt.text(x, y, text, transform=pp.ax.transAxes, fontsize=16, color='dimgrey', bbox=dict(facecolor='w', edgecolor='dimgrey', boxstyle='round'))
+                x_text = 0.05; y_text = 0.85
+                plt.text(x_text, y_text, text, transform=ax.transAxes, fontsize=16, color='dimgrey', bbox=dict(facecolor='w', edgecolor='dimgrey', boxstyle='round'))
 
-    ## 4. Plot label for parameters once (phantom plot for legend with many orders)
+        ax.autoscale_view()
+
+    ## 5. Plot label for parameters once (phantom plot for legend with many orders)
     # in case only ICPC were plotted so orders were used in labels rather than parameter labels
     if det_type == ['V']:
         for p in params:
@@ -161,7 +189,7 @@ def params_vs_det(params, det_type=['V'], avg=False):
                 ms=10, mfc='k' if not p in LABELS or LABELS[p] == 'L200 measurement' else 'none',\
                 linestyle='none', c = 'k', label=LABELS[p] if p in LABELS else '_nolegend_')
 
-    ## 5. Style plot
+    ## 6. Style plot
     # force xlim because of the phantom points at (-2,-2)
     ax.set_xlim(xmin=-1)
     ax.set_xticks(xticks)
@@ -183,7 +211,77 @@ def params_vs_det(params, det_type=['V'], avg=False):
     figname = 'plots/det_type{}_{}{}.pdf'.format('-'.join(det_type), '-'.join(params), ave)
     print('Saving as {}'.format(figname))
     plt.tight_layout()
-    plt.savefig(figname)
+    with profiling.stage('savefig', files=1):
+        plt.savefig(figname)
+
+    return figname
+
+
+def style(p):
+    '''
+    (string) -> (string, string)
+
+    Return marker and line style of given parameter as defined in SYMBOL
+    '''
+    symbol = SYMBOL[p][0] if p in SYMBOL else 'o'
+    # deafult solid line, otherwise defined in SYMBOL (only marker for no line)
+    lstyle = '-'
+    if p in SYMBOL: lstyle = SYMBOL[p][1:] if len(SYMBOL[p]) > 1 else 'none'
+    return symbol, lstyle
+
+
+def params_vs_det_batch(specs, metadata_path=METADATA_PATH, workers=1):
+    '''
+    (list, string, int) -> list
+
+    Plot several params_vs_det() figures from one table: the union of needed parameters and detector types is read once
+
+    specs [list]: list of (params, det_type, avg) as for params_vs_det() (det_type and avg can be left out)
+    metadata_path [string]: path to folder with detector metadata jsons
+    workers [int]: number of processes rendering the figures (1 = render here one by one)
+
+    Return list of saved figure names (in order of specs)
+
+    >>> params_vs_det_batch([(['mass'], ['V']), (['depV', 'depV_man'], ['V'], True), (['enr'], ['B', 'P', 'C'])])
+    ['plots/det_typeV_mass.pdf', 'plots/det_typeV_depV-depV_man_avg.pdf', 'plots/det_typeB-P-C_enr.pdf']
+    '''
+    # fill defaults of params_vs_det()
+    specs = [(list(s[0]), list(s[1]) if len(s) > 1 else ['V'], s[2] if len(s) > 2 else False) for s in specs]
+
+    ## 1. read union of parameters and detector types once
+    params = list(dict.fromkeys([p for s in specs for p in s[0]]))
+    det_type = sorted(set([t for s in specs for t in s[1]]))
+    df = info_table(params, metadata_path, det_type=det_type)
+
+    ## 2. render, each figure gets the same table as info_table() would return for its spec
+    jobs = [(s[0], s[1], s[2], select_rows(df, s[0], s[1])) for s in specs]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(render_job, jobs))
+
+    return [render_job(job) for job in jobs]
+
+
+def select_rows(df, params, det_type):
+    '''
+    (pd.DataFrame, list, list) -> pd.DataFrame
+
+    Return rows of given detector types and given params from an info_table() result,
+    with index and order as info_table(params, det_type=det_type) would give
+    '''
+    sel = df[df['det_name'].astype(str).str[0].isin(det_type)]
+    sel = sel[['det_name', 'order'] + list(params)]
+    # index = position in the list of detector names (see get_params()), then sorted by order
+    sel = sel.sort_values('det_name').reset_index(drop=True)
+    return sel.sort_values(['order', 'det_name'])
+
+
+def render_job(job):
+    ''' Plot one (params, det_type, avg, df) job of params_vs_det_batch() and close the figure '''
+    params, det_type, avg, df = job
+    figname = params_vs_det(params, det_type, avg, df=df)
+    plt.close('all')
+    return figname
 
 
 
@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import atexit
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# -------------------------------------------------------------------------------
+
+# set to 1 to print the stage report at exit, or to a file path to write it there
+ENV_VAR = 'DETECTOR_INFO_PROFILE'
+
+# stages in the order of the pipeline (report order)
+STAGES = ['listdir', 'json parse', 'field extraction', 'DataFrame construction', 'sort', 'plotting', 'savefig']
+
+# -------------------------------------------------------------------------------
+
+# stage name -> {'calls', 'time_s', 'files', 'bytes', 'peak_mem_MB'}
+STATS = {}
+ENABLED = False
+LOCK = threading.Lock()
+# stages currently open in any thread; stages nest (e.g. json parse inside DataFrame construction) and run concurrently in workers
+OPEN = []
+
+
+class stage:
+    '''
+    Context manager recording wall time, files, bytes and peak traced memory of a pipeline stage;
+    does nothing unless profiling is enabled (see profile() and ENV_VAR)
+
+    >>> with stage('json parse', files=1, nbytes=len(raw)):
+    ...     js = json.loads(raw)
+    '''
+
+    def __init__(self, name, files=0, nbytes=0):
+        '''
+        name [string]: stage name, see STAGES
+        files [int]: number of files handled in the stage
+        nbytes [int]: number of bytes read in the stage
+        '''
+        self.name = name
+        self.files = files
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        if ENABLED:
+            with LOCK:
+                self.peak = 0
+                fold_peak()
+                OPEN.append(self)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if not ENABLED or not hasattr(self, 'start'):
+            return False
+        elapsed = time.perf_counter() - self.start
+        with LOCK:
+            fold_peak()
+            if self in OPEN: OPEN.remove(self)
+            peak = self.peak / 1024.**2
+            st = STATS.setdefault(self.name, {'calls': 0, 'time_s': 0., 'files': 0, 'bytes': 0, 'peak_mem_MB': 0.})
+            st['calls'] += 1
+            st['time_s'] += elapsed
+            st['files'] += self.files
+            st['bytes'] += self.nbytes
+            st['peak_mem_MB'] = max(st['peak_mem_MB'], peak)
+        return False
+
+
+def fold_peak():
+    '''
+    Add the traced peak since the last reset to the peaks of all open stages, then reset it;
+    called under LOCK whenever a stage starts or ends, so that a reset never hides the peak of an outer or concurrent stage
+    '''
+    if not tracemalloc.is_tracing():
+        return
+    peak = tracemalloc.get_traced_memory()[1]
+    for st in OPEN:
+        st.peak = max(st.peak, peak)
+    tracemalloc.reset_peak()
+
+
+def enable(memory=True):
+    '''
+    Start recording stages (reset previous records)
+
+    memory [bool]: trace memory allocations for peak memory (slows down the pipeline)
+    '''
+    global ENABLED
+    STATS.clear()
+    OPEN.clear()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    ENABLED = True
+
+
+def disable():
+    ''' Stop recording stages '''
+    global ENABLED
+    ENABLED = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@contextmanager
+def profile(output=None, memory=True):
+    '''
+    Record stages of the code run inside and print the report at the end (or write it to output)
+
+    output [string]: file to write the report to (default print)
+    memory [bool]: trace peak memory
+
+    >>> with profile():
+    ...     params_vs_det(['mass'], ['V'])
+    stage                   calls   time [s]  files   bytes [MB]  peak mem [MB]
+    listdir                     1      0.001      0        0.000          0.120
+    ...
+    '''
+    enable(memory)
+    try:
+        yield STATS
+    finally:
+        disable()
+        report(output)
+
+
+def report(output=None):
+    '''
+    (string) -> string
+
+    Return the table of recorded stages and print it (or write it to output)
+
+    output [string]: file to write the report to (default print)
+    '''
+    lines = ['{:<24}{:>7}{:>11}{:>8}{:>13}{:>15}'.format('stage', 'calls', 'time [s]', 'files', 'bytes [MB]', 'peak mem [MB]')]
+    names = [s for s in STAGES if s in STATS] + sorted([s for s in STATS if s not in STAGES])
+    for name in names:
+        st = STATS[name]
+        lines.append('{:<24}{:>7}{:>11.3f}{:>8}{:>13.3f}{:>15.3f}'.format(name, st['calls'], st['time_s'], st['files'], st['bytes'] / 1024.**2, st['peak_mem_MB']))
+    text = '\n'.join(lines)
+
+    if output is None:
+        print(text)
+    else:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+        print('Profiling report saved to {}'.format(output), file=sys.stderr)
+
+    return text
+
+
+def report_at_exit():
+    ''' Report for ENV_VAR: print or write to the file given in ENV_VAR '''
+    value = os.environ.get(ENV_VAR, '')
+    disable()
+    report(None if value in ['1', 'true', 'yes'] else value)
+
+
+# opt-in with the environment variable
+if os.environ.get(ENV_VAR, '') not in ['', '0']:
+    enable()
+    atexit.register(report_at_exit)
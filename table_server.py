@@ -0,0 +1,345 @@
+'''
+Local query daemon: keeps the detector catalog of one or more metadata trees in memory and answers
+info_table() queries over HTTP on localhost or on a Unix socket, so that scripts and notebooks
+get tables without re-reading the jsons (or even importing the readers).
+
+    python -m detector_info serve --path legend-detectors/germanium/diodes/ --socket /tmp/detectors.sock
+
+    GET /info_table?params=mass,fwhm_Qbb&det_type=V&max_order=10&where=mass+>+2000&format=csv
+    GET /status
+
+Tables are returned as csv, json (list of records) or Arrow IPC stream (with pyarrow). The catalogs are refreshed
+by a background thread when files change: only changed jsons are parsed again (see DetectorCatalog.load()),
+and a new catalog replaces the old one at once; queries meanwhile are answered from the old one, so they never
+wait for a reload (changes are seen within the poll interval). Nothing is written to the served folders.
+
+>>> remote_info_table(['mass', 'fwhm_Qbb'], 'legend-detectors/germanium/diodes/', ['B'], address='/tmp/detectors.sock')
+   det_name  order   mass  fwhm_Qbb
+0   B00000A      0  0.496      2.37
+...
+'''
+import io
+import os
+import json
+import time
+import copy
+import socket
+import threading
+import socketserver
+import http.client
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Arrow IPC output is available when pyarrow is installed
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+from info_table import METADATA_PATH, JSON_FIELDS, COLUMN_TYPES, DetectorCatalog, detector_list, convert_units, typed_table, pd
+
+# -------------------------------------------------------------------------------
+
+# default address: (host, port) for HTTP on localhost, or path of a Unix socket
+ADDRESS = ('127.0.0.1', 8765)
+
+# output formats -> content type
+FORMATS = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+# -------------------------------------------------------------------------------
+
+class DetectorTableServer:
+    '''
+    Catalogs of given metadata trees kept in memory and refreshed when files change, queried with info_table() arguments
+
+    >>> tables = DetectorTableServer(['legend-detectors/germanium/diodes/'])
+    >>> tables.query({'params': 'mass,fwhm_Qbb', 'det_type': 'B', 'format': 'csv'})
+    (b'det_name,order,mass,fwhm_Qbb\\nB00000A,0,0.496,2.37\\n...', 'text/csv')
+    '''
+
+    def __init__(self, metadata_paths=[METADATA_PATH], workers=1, interval=2.):
+        '''
+        metadata_paths [list]: metadata folders or snapshot files to serve, the first one is the default
+        workers [int]: number of jsons to read concurrently when loading
+        interval [float]: seconds between checks for changed files
+        '''
+        if isinstance(metadata_paths, str): metadata_paths = [metadata_paths]
+        self.paths = {os.path.abspath(path): path for path in metadata_paths}
+        self.default = metadata_paths[0]
+        self.interval = interval
+
+        # metadata path -> (DetectorCatalog, load time); replaced as a whole by reload()
+        self.catalogs = {}
+        # one reload at a time (poll thread), queries do not take it
+        self.lock = threading.Lock()
+        for path in self.paths.values():
+            self.catalogs[path] = (DetectorCatalog(path, workers=workers), time.time())
+
+    def catalog(self, metadata_path):
+        '''
+        (string) -> DetectorCatalog
+
+        Return the current catalog of a served path, never waits for a reload (see poll())
+        '''
+        return self.catalogs[metadata_path][0]
+
+    def reload(self, metadata_path):
+        '''
+        (string) -> DetectorCatalog
+
+        If jsons were added, removed or changed since the last load, load a copy of the catalog (only changed jsons
+        are parsed, see DetectorCatalog.load()) and replace it; queries meanwhile are answered from the old one
+        '''
+        with self.lock:
+            cat, loaded = self.catalogs[metadata_path]
+            if cat.stale():
+                cat = copy.copy(cat)
+                cat.load()
+                self.catalogs[metadata_path] = (cat, time.time())
+        return cat
+
+    def poll(self):
+        ''' Check the served paths for changed files every interval seconds, forever '''
+        while True:
+            time.sleep(self.interval)
+            for path in self.paths.values():
+                try:
+                    self.reload(path)
+                except Exception as e:
+                    # keep serving the last catalog, e.g. while a file is half written
+                    print('Reload of {} failed: {}'.format(path, e))
+
+    def status(self):
+        ''' () -> dict: served paths with number of detectors and time of the last load '''
+        return {path: {'detectors': len(cat.table), 'loaded': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))}\
+            for path, (cat, t) in self.catalogs.items()}
+
+    def query(self, args):
+        '''
+        (dict) -> bytes, string
+
+        Answer an info_table() query, return the serialized table and its content type;
+        same table as info_table(), without the missing values report
+
+        args [dict]: query arguments as strings: params (comma separated), metadata_path (default the first served path),
+            det_type (comma separated or 'all'), max_order, where (see parse_where(), list of conditions as json),
+            format (see FORMATS, default csv)
+        '''
+        params = [p for p in args.get('params', '').split(',') if p != '']
+        if len(params) == 0:
+            raise ValueError('No parameters given')
+        for p in params:
+            if p not in JSON_FIELDS:
+                raise ValueError('Unknown parameter {}'.format(p))
+        path = self.paths.get(os.path.abspath(args['metadata_path'])) if 'metadata_path' in args else self.default
+        if path is None:
+            raise ValueError('Metadata path {} is not served'.format(args['metadata_path']))
+        det_type = args.get('det_type', 'all')
+        det_type = ['B','C','P','V'] if det_type == 'all' else det_type.split(',')
+        max_order = int(args.get('max_order', 10000))
+        where = args.get('where')
+        if where is not None and where.startswith('['):
+            where = json.loads(where)
+        fmt = args.get('format', 'csv')
+        if fmt not in FORMATS:
+            raise ValueError('Unknown format {}, use one of {}'.format(fmt, ', '.join(FORMATS)))
+
+        cat = self.catalog(path)
+        # detectors added since the catalog was loaded are answered after the next reload
+        names = cat.table.index
+        det_list = [det for det in detector_list(path, max_order, det_type) if det in names]
+        df = cat.project(det_list, params, where)
+        df = convert_units(df.sort_values(['order', 'det_name']), params)
+
+        return serialize(df, fmt), FORMATS[fmt]
+
+# -------------------------------------------------------------------------------
+
+class QueryHandler(BaseHTTPRequestHandler):
+    ''' GET /info_table?... -> table, GET /status -> json; bad queries -> 400 with the message as text '''
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        args = {key: vals[-1] for key, vals in urllib.parse.parse_qs(url.query).items()}
+        tables = self.server.tables
+        try:
+            if url.path == '/info_table':
+                body, content_type = tables.query(args)
+            elif url.path == '/status':
+                body, content_type = json.dumps(tables.status()).encode(), FORMATS['json']
+            else:
+                self.send_error(404)
+                return
+        except (ValueError, SyntaxError) as e:
+            self.reply(400, str(e).encode(), 'text/plain')
+            return
+        self.reply(200, body, content_type)
+
+    def reply(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # no client address on Unix sockets
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        # errors only, queries are not logged
+        pass
+
+    def log_error(self, format, *args):
+        BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    ''' HTTP server on a Unix socket, one thread per connection '''
+    daemon_threads = True
+
+
+def serve(metadata_paths=[METADATA_PATH], address=ADDRESS, workers=1, interval=2.):
+    '''
+    (list, tuple|string, int, float) -> None
+
+    Load the catalogs of given metadata trees and answer queries until interrupted (see module docstring)
+
+    metadata_paths [list]: metadata folders or snapshot files to serve, the first one is the default
+    address [tuple|string]: (host, port) for HTTP on localhost, or path of a Unix socket (replaced if it exists)
+    workers [int]: see DetectorTableServer
+    interval [float]: seconds between checks for changed files
+    '''
+    tables = DetectorTableServer(metadata_paths, workers, interval)
+    if isinstance(address, str):
+        if os.path.exists(address): os.remove(address)
+        server = UnixHTTPServer(address, QueryHandler)
+    else:
+        server = ThreadingHTTPServer(address, QueryHandler)
+    server.tables = tables
+
+    threading.Thread(target=tables.poll, daemon=True).start()
+    print('Serving {} on {}'.format(', '.join(tables.paths.values()), address if isinstance(address, str) else 'http://{}:{}'.format(*address)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if isinstance(address, str) and os.path.exists(address): os.remove(address)
+
+# -------------------------------------------------------------------------------
+# client
+# -------------------------------------------------------------------------------
+
+def remote_info_table(params, metadata_path=None, det_type='all', max_order=10000, where=None, address=ADDRESS, format=None):
+    '''
+    (list, string, list, int, string|list, tuple|string, string) -> pd.DataFrame
+
+    Same table as info_table(), answered by a running server (see serve()); raise ValueError for bad queries
+
+    params [list]: list of parameter keywords as defined in JSON_FIELDS
+    metadata_path [string]: one of the served paths (default the first one)
+    det_type [list|string]: detector type(s), 'all' for all types
+    max_order [int]: maximum order
+    where [string|list]: filter, see parse_where()
+    address [tuple|string]: (host, port) or path of the Unix socket of the server
+    format [string]: transfer format, see FORMATS (default arrow if pyarrow is installed, otherwise csv)
+    '''
+    if format is None:
+        format = 'csv' if pyarrow is None else 'arrow'
+    args = {'params': ','.join(params), 'det_type': det_type if isinstance(det_type, str) else ','.join(det_type),\
+        'max_order': max_order, 'format': format}
+    if metadata_path is not None: args['metadata_path'] = metadata_path
+    if where is not None: args['where'] = where if isinstance(where, str) else json.dumps([list(c) for c in where])
+
+    body = request('/info_table?' + urllib.parse.urlencode(args), address)
+    return deserialize(body, format, ['det_name', 'order'] + list(params))
+
+
+def request(url, address=ADDRESS):
+    '''
+    (string, tuple|string) -> bytes
+
+    GET url from the server, return the body; raise ValueError with the message of the server on errors
+    '''
+    if isinstance(address, str):
+        conn = UnixHTTPConnection(address)
+    else:
+        conn = http.client.HTTPConnection(*address)
+    try:
+        conn.request('GET', url)
+        resp = conn.getresponse()
+        body = resp.read()
+    finally:
+        conn.close()
+    if resp.status != 200:
+        raise ValueError(body.decode(errors='replace') or resp.reason)
+
+    return body
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    ''' HTTP connection over a Unix socket '''
+
+    def __init__(self, path):
+        super().__init__('localhost')
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+# -------------------------------------------------------------------------------
+# helper functions
+# -------------------------------------------------------------------------------
+
+def serialize(df, fmt):
+    '''
+    (pd.DataFrame, string) -> bytes
+
+    Table in given format (see FORMATS); dates are written as YYYY-MM-DD in csv and json
+    '''
+    if fmt == 'arrow':
+        if pyarrow is None:
+            raise ValueError('Arrow format needs pyarrow on the server')
+        sink = pyarrow.BufferOutputStream()
+        table = pyarrow.Table.from_pandas(df, preserve_index=False)
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    if fmt == 'csv':
+        return df.to_csv(index=False, date_format='%Y-%m-%d').encode()
+    if fmt == 'json':
+        for col in df.columns:
+            if COLUMN_TYPES.get(col) == 'datetime':
+                df[col] = df[col].dt.strftime('%Y-%m-%d')
+        return df.to_json(orient='records').encode()
+
+    raise ValueError('Unknown format {}, use one of {}'.format(fmt, ', '.join(FORMATS)))
+
+
+def deserialize(body, fmt, columns):
+    '''
+    (bytes, string, list) -> pd.DataFrame
+
+    Table from the body of a server reply, with the column types of info_table()
+    '''
+    if fmt == 'arrow':
+        return pyarrow.ipc.open_stream(body).read_pandas()
+    if fmt == 'csv':
+        df = pd.read_csv(io.BytesIO(body))
+    else:
+        df = pd.DataFrame(json.loads(body), columns=columns)
+
+    return typed_table(df)
+
+
+if __name__ == '__main__':
+    serve()
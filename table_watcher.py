@@ -0,0 +1,179 @@
+import os
+import time
+import pandas as pd
+
+# inotify is used when available (Linux), otherwise the folder is polled
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+from info_table import METADATA_PATH, info_table, iter_detectors, convert_units, typed_table, get_index, parse_where, select_names
+
+# -------------------------------------------------------------------------------
+
+class DetectorTableWatcher:
+    '''
+    Keep the info_table() result in memory and up to date with the metadata folder:
+    only jsons that were added, changed or removed since the last refresh are read, the rows are updated in place.
+
+    Subscribers are called after each refresh with changes, a dict
+        'added': [detector names], 'removed': [detector names], 'changed': {detector name: [changed columns]}
+
+    >>> w = DetectorTableWatcher(['mass', 'fwhm_Qbb'], det_type=['V'])
+    >>> w.subscribe(print)
+    >>> w.run(interval=10)
+    {'added': [], 'removed': [], 'changed': {'V06643A': ['fwhm_Qbb']}}
+    '''
+
+    def __init__(self, params, metadata_path=METADATA_PATH, det_type='all', max_order=10000, where=None):
+        '''
+        params [list]: list of parameter keywords as defined in JSON_FIELDS
+        metadata_path [string]: path to folder with detector metadata jsons
+        det_type [list|string]: detector type(s), 'all' for all types (see info_table())
+        max_order [int]: maximum order
+        where [string|list]: filter, see parse_where()
+        '''
+        self.params = params
+        self.metadata_path = metadata_path
+        self.det_type = ['B','C','P','V'] if det_type == 'all' else ([det_type] if isinstance(det_type, str) else det_type)
+        self.max_order = max_order
+        self.where = where
+        self.subscribers = []
+
+        self.mtimes = self.scan()
+        self.table = info_table(params, metadata_path, self.det_type, max_order, catalog=False, where=where)
+        self.table = self.table.set_index('det_name', drop=False).rename_axis(None)
+
+    def subscribe(self, callback):
+        ''' Call callback(changes) after every refresh that changed the table '''
+        self.subscribers.append(callback)
+
+    def scan(self):
+        '''
+        () -> dict
+
+        Return mtime and size of each selected detector json
+        '''
+        index = get_index(self.metadata_path)
+        det_list = index.select(det_type=self.det_type, max_order=self.max_order)
+        if self.where is not None:
+            det_list = select_names(det_list, parse_where(self.where))
+
+        res = {}
+        for det in det_list:
+            try:
+                st = os.stat(os.path.join(self.metadata_path, det + '.json'))
+            except FileNotFoundError:
+                continue
+            res[det] = (st.st_mtime_ns, st.st_size)
+
+        return res
+
+    def refresh(self):
+        '''
+        () -> dict
+
+        Re-read jsons changed since the last refresh, update the table and notify subscribers; return the changes
+        '''
+        mtimes = self.scan()
+        touched = sorted([det for det in mtimes if self.mtimes.get(det) != mtimes[det]])
+        gone = [det for det in self.mtimes if det not in mtimes]
+        self.mtimes = mtimes
+
+        changes = {'added': [], 'removed': [], 'changed': {}}
+        if len(touched) + len(gone) == 0:
+            return changes
+
+        # detectors failing the filter are not returned
+        records = {rec['det_name']: rec for rec in iter_detectors(self.params, self.metadata_path, touched, where=self.where)}
+        gone += [det for det in touched if det not in records and det in self.table.index]
+
+        for det in gone:
+            if det in self.table.index:
+                changes['removed'].append(det)
+        self.table = self.table.drop(changes['removed'])
+
+        if len(records) > 0:
+            new = pd.DataFrame(list(records.values()), columns=['det_name', 'order'] + list(self.params))
+            new = convert_units(typed_table(new), self.params)
+            new = new.set_index('det_name', drop=False).rename_axis(None)
+            for det in new.index:
+                if det not in self.table.index:
+                    changes['added'].append(det)
+                    continue
+                cols = [p for p in self.params if not equal(self.table.at[det, p], new.at[det, p])]
+                if len(cols) > 0:
+                    changes['changed'][det] = cols
+                    for p in cols:
+                        set_value(self.table, det, p, new.at[det, p])
+            if len(changes['added']) > 0:
+                # categories of the two tables differ -> type again
+                self.table = typed_table(pd.concat([self.table, new.loc[changes['added']]]))
+
+        if len(changes['added']) + len(changes['removed']) > 0:
+            self.table = self.table.sort_values(['order', 'det_name'])
+
+        if len(changes['added']) + len(changes['removed']) + len(changes['changed']) > 0:
+            for callback in self.subscribers:
+                callback(changes)
+
+        return changes
+
+    def run(self, interval=5., n_refresh=None):
+        '''
+        Refresh the table every interval seconds (or as soon as inotify reports changes in the folder)
+
+        interval [float]: seconds between refreshes (with inotify: maximum time waited for events)
+        n_refresh [int]: stop after this many refreshes (default run forever)
+        '''
+        notify = None
+        if inotify_simple is not None:
+            notify = inotify_simple.INotify()
+            flags = inotify_simple.flags
+            notify.add_watch(self.metadata_path, flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.DELETE | flags.CREATE)
+
+        i = 0
+        while n_refresh is None or i < n_refresh:
+            if notify is not None:
+                notify.read(timeout=int(interval * 1000))
+            else:
+                time.sleep(interval)
+            self.refresh()
+            i += 1
+
+        if notify is not None: notify.close()
+
+    def info_table(self):
+        '''
+        () -> pd.DataFrame
+
+        Return copy of the current table in info_table() format
+        '''
+        return self.table.reset_index(drop=True)
+
+# -------------------------------------------------------------------------------
+# helper functions
+# -------------------------------------------------------------------------------
+
+def set_value(table, det, col, value):
+    ''' Set table value in place, keeping the (compact) column type '''
+    if isinstance(table[col].dtype, pd.CategoricalDtype):
+        if not pd.isna(value) and value not in table[col].cat.categories:
+            table[col] = table[col].cat.add_categories([value])
+    elif not pd.isna(value):
+        value = table[col].dtype.type(value)
+    table.at[det, col] = value
+
+
+def equal(a, b):
+    ''' Compare table values, missing values (NaN/NA) are equal to each other '''
+    if pd.isna(a) is True and pd.isna(b) is True:
+        return True
+    return a == b
+
+
+if __name__ == '__main__':
+    watcher = DetectorTableWatcher(['mass', 'fwhm_Qbb'], det_type=['V'])
+    watcher.subscribe(print)
+    watcher.run()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# modules are at the top of the repository, not installed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_tree
+from old_to_new_format import parse_old_to_new
+
+# detectors per synthetic tree: enough for all types, GERDA Coax names and missing values
+N_DET = 120
+
+
+@pytest.fixture(scope='session')
+def old_tree(tmp_path_factory):
+    ''' synthetic tree in the old format (input of parse_old_to_new()) '''
+    path = str(tmp_path_factory.mktemp('old_format'))
+    make_tree(path, N_DET, 'old', seed=7)
+    return path
+
+
+@pytest.fixture(scope='session')
+def migrated_tree(old_tree, tmp_path_factory):
+    ''' output folder of parse_old_to_new() on old_tree, jsons in detectors/ '''
+    path = str(tmp_path_factory.mktemp('new_format'))
+    parse_old_to_new(old_tree, path)
+    return path
+
+
+@pytest.fixture(scope='session')
+def new_tree(tmp_path_factory):
+    ''' synthetic tree in the JSON_FIELDS layout '''
+    path = str(tmp_path_factory.mktemp('detectors'))
+    make_tree(path, N_DET, 'new', seed=8)
+    return path
@@ -0,0 +1,87 @@
+import os
+import json
+import random
+
+import pytest
+
+import info_table
+from info_table import JSON_FIELDS, info_table as table, detector_list, cached_records, json_records, export_snapshot
+from benchmarks.synthetic import new_detector
+
+
+def write_detector(path, name, **production):
+    ''' synthetic new format json of given name, production fields replaced by given values '''
+    js = new_detector(name, random.Random(name), 0.)
+    js['production'].update(production)
+    with open(os.path.join(path, name + '.json'), 'w') as f:
+        json.dump(js, f)
+
+
+def test_coax_names(tmp_path, capsys):
+    names = ['B00000A', 'C000RG1', 'C000RG2', 'C00ANG3', 'V04545A']
+    for det in names:
+        write_detector(str(tmp_path), det)
+    (tmp_path / 'notes.json').write_text('{}')
+
+    assert detector_list(str(tmp_path), 10000, ['B','C','P','V']) == names
+    assert 'notes.json' in capsys.readouterr().out
+    assert list(table(['mass'], str(tmp_path))['det_name']) == names
+    assert info_table.DetectorIndex(str(tmp_path)).records['C000RG1'] == ('C', 0, '0RG', '1')
+
+
+@pytest.fixture
+def float_tree(tmp_path):
+    ''' tree with masses that float32 does not keep (3460.9 g, 2286.237 g) '''
+    path = str(tmp_path / 'detectors')
+    os.mkdir(path)
+    for det, mass in [('V04545A', 3460.9), ('V04545B', 2286.237), ('V05261A', 3461.), ('B00000A', 700.)]:
+        write_detector(path, det, mass_in_g=mass)
+    return path
+
+
+@pytest.mark.parametrize('where', ['mass == 3460.9', 'mass >= 3460.9 and mass <= 3460.9', 'order in {4} and mass == 3460.9'])
+def test_where_on_float_fields(float_tree, tmp_path, where):
+    snapshot = export_snapshot(float_tree, str(tmp_path / 'detectors.snap'))
+    cache = str(tmp_path / 'cache.json')
+
+    results = {
+        'direct': table(['mass'], float_tree, catalog=False, where=where),
+        # before and after the shared catalog is loaded
+        'catalog first': table(['mass'], float_tree, where=where),
+        'catalog loaded': (table(['mass'], float_tree), table(['mass'], float_tree, where=where))[1],
+        'cache': table(['mass'], float_tree, cache=cache, catalog=False, where=where),
+        'catalog from cache': table(['mass'], float_tree, catalog=info_table.DetectorCatalog(float_tree, cache), where=where),
+        'snapshot': table(['mass'], snapshot, where=where),
+    }
+    for name, df in results.items():
+        assert list(df['det_name']) == ['V04545A'], name
+    assert [rec['det_name'] for rec in cached_records(['mass'], float_tree, where=where, cache_path=cache)] == ['V04545A']
+    assert [rec['det_name'] for rec in json_records(['mass'], float_tree, where=where)] == ['V04545A']
+
+
+def test_records_keep_stored_values(float_tree, tmp_path):
+    params = ['mass', 'fwhm_Qbb', 'date', 'repr', 'daq']
+    direct = json_records(params, float_tree)
+    assert direct == cached_records(params, float_tree, cache_path=str(tmp_path / 'cache.json'))
+    assert {rec['det_name']: rec['mass'] for rec in direct}['V04545B'] == 2.286237
+
+
+def test_cache_not_written_into_metadata_folder(float_tree, tmp_path, monkeypatch):
+    monkeypatch.setattr(info_table, 'CACHE_DIR', str(tmp_path / 'user_cache'))
+    assert len(cached_records(['mass'], float_tree)) == 4
+    assert sorted(os.listdir(float_tree)) == ['B00000A.json', 'V04545A.json', 'V04545B.json', 'V05261A.json']
+    assert os.path.exists(info_table.cache_file(float_tree))
+
+    # cache folder cannot be created -> answered anyway
+    monkeypatch.setattr(info_table, 'CACHE_DIR', os.path.join(float_tree, 'V04545A.json', 'cache'))
+    assert len(table(['mass'], float_tree, cache=True, catalog=False)) == 4
+
+
+def test_old_tree_reads_like_migration(old_tree, migrated_tree):
+    params = list(JSON_FIELDS)
+    old = table(params, old_tree, catalog=False).reset_index(drop=True)
+    migrated = table(params, os.path.join(migrated_tree, 'detectors'), catalog=False).reset_index(drop=True)
+
+    assert old.equals(migrated)
+    for p in ['fwhm_Qbb', 'sf_Qbb', 'depV']:
+        assert migrated[p].notna().any(), p
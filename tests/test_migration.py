@@ -0,0 +1,141 @@
+import os
+import json
+import shutil
+from collections import OrderedDict
+
+import old_to_new_format
+from old_to_new_format import parse_old_to_new
+
+# -------------------------------------------------------------------------------
+# conversion of one detector as done by the hand-written parse_old_to_new() before the rules (OLD_TO_NEW),
+# kept as reference for the compiled rules
+# -------------------------------------------------------------------------------
+
+class MyOrderedDict(OrderedDict):
+
+    def rename(self, key_old, key_new):
+        for _ in range(len(self)):
+            k, v = self.popitem(False)
+            self[key_new if key_old == k else k] = v
+
+
+def order_dict(dct):
+    ''' make nested OrderedDict '''
+    for key in dct:
+        if type(dct[key]) == dict:
+            dct[key] = order_dict(dct[key])
+
+    return MyOrderedDict(dct)
+
+
+def baseline_convert(js):
+    '''
+    (dict) -> dict, float
+
+    Return the detector json in the new format and its non-zero dead layer (None if zero or missing)
+    '''
+    js = order_dict(js)
+    js['characterization']['l200_site'].pop('data')
+    js['characterization']['l200_site'].pop('elog')
+
+    js.rename('det_name', 'name')
+    js.move_to_end('name', last=False)
+
+    js['geometry'].rename('bottom_cyl', 'bottom_cylinder')
+    js['production'].rename('dep_voltage_in_V', 'depletion_voltage_in_V')
+    js['production'].rename('rec_voltage_in_V', 'recommended_voltage_in_V')
+    js['characterization']['manufacturer'].rename('dep_voltage_in_V', 'depletion_voltage_in_V')
+    js['characterization']['manufacturer'].rename('op_voltage_in_V', 'recommended_voltage_in_V')
+    js['characterization']['l200_site'].rename('res', 'fwhm')
+    js['characterization']['l200_site'].rename('sf', 'survival_fraction')
+    js['characterization']['manufacturer'].rename('57co_fep_res_in_keV', 'fwhm_co57fep_in_keV')
+    js['characterization']['manufacturer'].rename('60co_fep_res_in_keV', 'fwhm_co60fep_in_keV')
+
+    js['production']['mass_in_g'] = js['geometry']['mass_in_g']
+    del js['geometry']['mass_in_g']
+    js['production'].move_to_end('mass_in_g', last=False)
+    for key in ['reprocessing', 'enrichment', 'slice', 'crystal', 'serialno', 'order', 'manufacturer']:
+        js['production'].move_to_end(key, last=False)
+
+    dl = None
+    if 'dl_thickness_in_mm' in js['geometry']:
+        if js['geometry']['dl_thickness_in_mm'] > 0:
+            dl = js['geometry']['dl_thickness_in_mm']
+        del js['geometry']['dl_thickness_in_mm']
+
+    if js['production']['delivered'] == '':
+        js['production']['delivered'] = None
+    else:
+        dd, mm, yyyy = js['production']['delivered'].split('-')
+        js['production']['delivered'] = '-'.join([yyyy,mm,dd])
+
+    if js['production']['enrichment'] == 0:
+        js['production']['enrichment'] = None
+    if js['production']['depletion_voltage_in_V'] == 0:
+        js['production']['depletion_voltage_in_V'] = None
+    for v in ['depletion_voltage_in_V', 'recommended_voltage_in_V']:
+        if js['characterization']['manufacturer'][v] == 0:
+            js['characterization']['manufacturer'][v] = None
+    for src in ['fwhm_co57fep_in_keV', 'fwhm_co60fep_in_keV']:
+        if js['characterization']['manufacturer'][src] == 0:
+            js['characterization']['manufacturer'][src] = None
+    for src in ['cofep_in_keV', 'tlfep_in_keV', 'qbb_in_keV']:
+        if ( not src in js['characterization']['l200_site']['fwhm'] ) or ( js['characterization']['l200_site']['fwhm'][src] == 0 ):
+            js['characterization']['l200_site']['fwhm'][src] = None
+    for src in ['tldep_in_pc', 'qbb_in_pc', 'tlsep_in_pc', 'tlfep_in_pc']:
+        if js['characterization']['l200_site']['survival_fraction'][src] == 0:
+            js['characterization']['l200_site']['survival_fraction'][src] = None
+
+    return js, dl
+
+# -------------------------------------------------------------------------------
+
+def test_rules_give_baseline_output(old_tree, migrated_tree):
+    names = sorted(x[:-len('.json')] for x in os.listdir(old_tree) if x.endswith('.json'))
+    assert sorted(os.listdir(os.path.join(migrated_tree, 'detectors'))) == [det + '.json' for det in names]
+
+    dls = []
+    for det in names:
+        with open(os.path.join(old_tree, det + '.json')) as f:
+            js, dl = baseline_convert(json.load(f))
+        if dl is not None:
+            dls.append('{},{}'.format(det, dl))
+        with open(os.path.join(migrated_tree, 'detectors', det + '.json'), encoding='utf-8') as f:
+            assert f.read() == json.dumps(js, ensure_ascii=False, indent=2), det
+
+    with open(os.path.join(migrated_tree, 'dl_thickness_in_mm.csv')) as f:
+        assert f.read().splitlines() == ['det_name,dl_thickness_in_mm'] + dls
+
+
+def test_outputs_of_removed_sources_are_deleted(old_tree, tmp_path, monkeypatch):
+    src, out = str(tmp_path / 'old'), str(tmp_path / 'new')
+    shutil.copytree(old_tree, src)
+    parse_old_to_new(src, out)
+    names = sorted(x[:-len('.json')] for x in os.listdir(src))
+
+    def output(det):
+        return os.path.join(out, 'detectors', det + '.json')
+
+    # source removed and other rules
+    os.remove(os.path.join(src, names[0] + '.json'))
+    monkeypatch.setattr(old_to_new_format, 'RULES_VERSION', 'other')
+    parse_old_to_new(src, out)
+    assert not os.path.exists(output(names[0]))
+
+    # source removed, forced run
+    os.remove(os.path.join(src, names[1] + '.json'))
+    parse_old_to_new(src, out, force=True)
+    assert not os.path.exists(output(names[1]))
+
+    # source that cannot be converted any more
+    path = os.path.join(src, names[2] + '.json')
+    with open(path) as f:
+        js = json.load(f)
+    js['production'] = 5
+    with open(path, 'w') as f:
+        json.dump(js, f)
+    report = parse_old_to_new(src, out)
+    assert (report['det_name'] == names[2]).any()
+    assert not os.path.exists(output(names[2]))
+
+    assert sorted(os.listdir(os.path.join(out, 'detectors'))) == [det + '.json' for det in names[3:]]
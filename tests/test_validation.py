@@ -0,0 +1,34 @@
+import os
+import json
+import shutil
+
+from validation import validate_tree, problems
+
+
+def test_migrated_tree_is_valid(migrated_tree):
+    report = validate_tree(os.path.join(migrated_tree, 'detectors'), workers=1)
+    assert not problems(report).any()
+
+
+def test_new_tree_is_valid(new_tree):
+    report = validate_tree(new_tree, workers=1)
+    assert not problems(report).any()
+
+
+def test_problems_of_migrated_files(migrated_tree, tmp_path):
+    path = str(tmp_path / 'detectors')
+    shutil.copytree(os.path.join(migrated_tree, 'detectors'), path)
+    det = sorted(os.listdir(path))[0]
+    with open(os.path.join(path, det)) as f:
+        js = json.load(f)
+    del js['characterization']['l200_site']['fwhm']['qbb_in_keV']
+    js['characterization']['l200_site']['survival_fraction']['qbb_in_pc'] = 0
+    js['production']['delivered'] = '01-02-2020'
+    with open(os.path.join(path, det), 'w') as f:
+        json.dump(js, f)
+
+    report = validate_tree(path, workers=1).set_index('path')
+    assert report.loc['characterization/l200_site/fwhm/qbb_in_keV', 'missing'] == 1
+    assert report.loc['characterization/l200_site/survival_fraction/qbb_in_pc', 'zero'] == 1
+    assert report.loc['production/delivered', 'bad_format'] == 1
+    assert problems(report).sum() == 3
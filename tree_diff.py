@@ -0,0 +1,117 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from info_table import METADATA_PATH, JSON_FIELDS, get_index, get_snapshot, is_snapshot, loads_json, extract_fields, schema_version
+from old_to_new_format import TEST_PATH, OLD_TO_NEW_PLAN
+from migration import migrate
+
+# -------------------------------------------------------------------------------
+
+def diff_trees(a=METADATA_PATH, b=os.path.join(TEST_PATH, 'detectors', ''), workers=8):
+    '''
+    (string, string, int) -> pd.DataFrame
+
+    Compare two metadata trees (folders or snapshots, see export_snapshot()) and return the changes:
+    files are hashed first and only detectors whose files differ are parsed and compared field by field;
+    old format jsons are converted with the OLD_TO_NEW rules before comparing, so a tree can be compared to its migration
+
+    a [string]: metadata folder or snapshot (reference)
+    b [string]: metadata folder or snapshot (default the detector jsons written by parse_old_to_new())
+    workers [int]: number of files read concurrently
+
+    Return change table with columns det_name, change ('added', 'removed', 'changed'), field, a, b:
+    one row per changed JSON_FIELDS value; field is None for added / removed detectors
+    and for detectors where only fields outside JSON_FIELDS changed
+
+    >>> diff_trees('legend-detectors/germanium/detectors/', 'new_format/detectors/')
+    300 detectors: 297 unchanged, 3 changed, 0 added, 0 removed
+      det_name   change     field    a     b
+    0  V02160A  changed      mass  1880.0 1881.0
+    ...
+    '''
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        hashes_a, hashes_b = file_hashes(a, ex), file_hashes(b, ex)
+
+        added = sorted(set(hashes_b) - set(hashes_a))
+        removed = sorted(set(hashes_a) - set(hashes_b))
+        # same file -> nothing to parse
+        differ = [det for det in sorted(set(hashes_a) & set(hashes_b)) if hashes_a[det] != hashes_b[det]]
+        diffs = list(ex.map(diff_detector, differ, [a]*len(differ), [b]*len(differ)))
+
+    res = {'det_name': [], 'change': [], 'field': [], 'a': [], 'b': []}
+    def add(det, change, field=None, va=None, vb=None):
+        res['det_name'].append(det)
+        res['change'].append(change)
+        res['field'].append(field)
+        res['a'].append(va)
+        res['b'].append(vb)
+
+    n_changed = 0
+    for det, diff in zip(differ, diffs):
+        # None: same content in another format or layout
+        if diff is None: continue
+        n_changed += 1
+        if len(diff) == 0:
+            add(det, 'changed')
+        for field, va, vb in diff:
+            add(det, 'changed', field, va, vb)
+    for det in added:
+        add(det, 'added')
+    for det in removed:
+        add(det, 'removed')
+
+    n = len(set(hashes_a) | set(hashes_b))
+    print('{} detectors: {} unchanged, {} changed, {} added, {} removed'.format(n, n - n_changed - len(added) - len(removed),\
+        n_changed, len(added), len(removed)))
+
+    return pd.DataFrame(res).sort_values(['det_name', 'field'], na_position='first', ignore_index=True)
+
+
+def file_hashes(metadata_path, executor=None):
+    '''
+    (string, Executor) -> dict
+
+    Return detector name -> sha1 of its raw json for all detectors of a metadata folder or snapshot
+
+    executor [Executor]: executor to read files concurrently (default one by one)
+    '''
+    names = get_index(metadata_path).names
+    digests = (executor.map if executor is not None else map)(lambda det: hashlib.sha1(read_raw(metadata_path, det)).hexdigest(), names)
+
+    return dict(zip(names, digests))
+
+
+def diff_detector(det, a, b):
+    '''
+    (string, string, string) -> list
+
+    Return [(field, value in a, value in b)] for the JSON_FIELDS values of given detector that differ between two trees;
+    empty list if only other fields differ, None if the documents are the same once in the new format
+    '''
+    js_a, js_b = read_document(a, det), read_document(b, det)
+    if js_a == js_b:
+        return None
+    vals_a, vals_b = extract_fields(js_a), extract_fields(js_b)
+    return [(p, va, vb) for p, va, vb in zip(JSON_FIELDS, vals_a, vals_b) if va != vb]
+
+# -------------------------------------------------------------------------------
+# helper functions
+# -------------------------------------------------------------------------------
+
+def read_raw(metadata_path, det):
+    ''' (string, string) -> bytes: raw json of given detector from a metadata folder or snapshot '''
+    if is_snapshot(metadata_path):
+        return get_snapshot(metadata_path).raw(det)
+    with open(os.path.join(metadata_path, det + '.json'), 'rb') as f:
+        return f.read()
+
+
+def read_document(metadata_path, det):
+    ''' (string, string) -> dict: json of given detector in the new format (old format converted on the fly) '''
+    js = loads_json(read_raw(metadata_path, det))
+    if schema_version(js) == 'old':
+        js = migrate(js, OLD_TO_NEW_PLAN)
+
+    return js
@@ -0,0 +1,240 @@
+import re
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+from info_table import METADATA_PATH, JSON_FIELDS, get_index, loads_json, schema_version, field_accessors
+from old_to_new_format import OLD_TO_NEW
+from tree_diff import read_raw
+
+# -------------------------------------------------------------------------------
+
+# expected type of the JSON_FIELDS values (default 'number'); null is allowed for all of them
+FIELD_TYPES = {
+    'date': 'date',
+    'man': 'string',
+    'cry': 'string',
+    'daq': 'string',
+    'serialno': 'string',
+    'repr': 'bool',
+}
+
+# problems counted per field, in the order of the report columns
+PROBLEMS = ['missing', 'null', 'wrong_type', 'zero', 'bad_format']
+
+# detector name field, must match the file name
+NAME_PATH = ['name']
+
+# layouts checked, each json against the one of its schema version (see schema_version()); old format jsons as 'new'
+SCHEMA_VERSIONS = ['new', 'migrated']
+
+# examples of detector names kept per field and problem
+N_EXAMPLES = 5
+
+# -------------------------------------------------------------------------------
+
+def validate_tree(metadata_path=METADATA_PATH, workers=None, chunksize=256):
+    '''
+    (string, int, int) -> pd.DataFrame
+
+    Check all detector jsons of a metadata folder (or snapshot) against the schema compiled from the json paths
+    of their schema version (JSON_FIELDS layout or migrated, see field_accessors()), FIELD_TYPES and the null rules
+    of OLD_TO_NEW (see compile_schema()), in a process pool; print the fields with problems and return the report
+    aggregated per json path
+
+    metadata_path [string]: path to folder with detector metadata jsons, or snapshot file
+    workers [int]: number of processes (default number of cpus, 1 = check here one by one)
+    chunksize [int]: number of files per task
+
+    Return report with one row per json path of the fields: field, path, required, then number of files per problem (PROBLEMS:
+    missing, null, wrong_type, zero (0 where null is expected), bad_format (date format, name not matching the file name)),
+    and examples (detector names per problem)
+
+    >>> validate_tree('legend-detectors/germanium/diodes/')
+    3000 files checked in 1.2 s
+          field                                           path  missing  zero  bad_format   examples
+       recV_man  characterization/manufacturer/recommended_...        0     4           0   {'zero': ['V05261A', ...]}
+    '''
+    t0 = time.time()
+    names = get_index(metadata_path).names
+    chunks = [names[i:i+chunksize] for i in range(0, len(names), chunksize)]
+    if workers is None:
+        workers = os.cpu_count()
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(validate_chunk, [metadata_path]*len(chunks), chunks))
+    else:
+        results = [validate_chunk(metadata_path, chunk) for chunk in chunks]
+
+    ## aggregate
+    counts, examples = {}, {}
+    for res_counts, res_examples in results:
+        for key, n in res_counts.items():
+            counts[key] = counts.get(key, 0) + n
+        for key, dets in res_examples.items():
+            ex_list = examples.setdefault(key, [])
+            ex_list += dets[:N_EXAMPLES - len(ex_list)]
+
+    rows = []
+    for path, check in SCHEMA_CHECKS.items():
+        row = {'field': check['field'], 'path': check['path'], 'required': check['required']}
+        for prob in PROBLEMS:
+            row[prob] = counts.get((check['path'], prob), 0)
+        row['examples'] = {prob: examples[(check['path'], prob)] for prob in PROBLEMS if (check['path'], prob) in examples}
+        rows.append(row)
+    if counts.get(('json', 'bad_format'), 0) > 0:
+        rows.append({'field': 'json', 'path': '', 'required': True, **{prob: 0 for prob in PROBLEMS},\
+            'bad_format': counts[('json', 'bad_format')], 'examples': {'bad_format': examples[('json', 'bad_format')]}})
+    report = pd.DataFrame(rows, columns=['field', 'path', 'required'] + PROBLEMS + ['examples'])
+
+    print('{} files checked in {:.1f} s'.format(len(names), time.time() - t0))
+    bad = problems(report)
+    if bad.any():
+        print(report.loc[bad, ['field', 'path', 'missing', 'wrong_type', 'zero', 'bad_format', 'examples']].to_string(index=False))
+
+    return report
+
+
+def problems(report):
+    ''' (pd.DataFrame) -> pd.Series: rows of a validate_tree() report with problems (missing counts only for required fields) '''
+    return (report[['wrong_type', 'zero', 'bad_format']].sum(axis=1) > 0) | (report['required'] & (report['missing'] > 0))
+
+
+def compile_schema(fields=JSON_FIELDS, rules=OLD_TO_NEW):
+    '''
+    (dict, list) -> dict, dict
+
+    Compile the expected structure: one check per json path of the fields (type, required, zero not allowed, date format)
+    from FIELD_TYPES and the null / date rules of the migration (see migration.py), merged into a tree of nested keys
+    like compile_fields(), so that each document is checked in one walk. Rules apply to the field at the same path only:
+    the migration wrote that path, other layouts are not required to have it
+
+    fields [dict]: parameter -> json path, e.g. JSON_FIELDS or field_accessors('migrated')[0]
+    rules [list]: migration rules, e.g. OLD_TO_NEW: null_if_zero -> 0 not allowed, null_if_missing -> required, date -> format
+
+    Return checks (path tuple -> check dict) and tree
+    '''
+    checks = {tuple(NAME_PATH): new_check('name', NAME_PATH, 'string', required=True)}
+    for p, path in fields.items():
+        checks[tuple(path)] = new_check(p, path, FIELD_TYPES.get(p, 'number'))
+
+    for rule in rules:
+        kind, path = rule[0], tuple(rule[1])
+        if kind not in ['null_if_zero', 'null_if_missing', 'date'] or path not in checks:
+            continue
+        check = checks[path]
+        if kind == 'null_if_zero':
+            check['no_zero'] = True
+        elif kind == 'null_if_missing':
+            check['required'] = True
+        else:
+            check['type'] = 'date'
+            check['format'] = date_pattern(rule[3])
+
+    tree = {}
+    for path, check in checks.items():
+        node = tree
+        for f in path[:-1]:
+            node = node.setdefault(f, ({}, []))[0]
+        node.setdefault(path[-1], ({}, []))[1].append(check)
+
+    return checks, tree
+
+
+def new_check(field, path, kind, required=False):
+    ''' (string, list, string, bool) -> dict: check of one json path, see compile_schema() '''
+    return {'field': field, 'path': '/'.join(path), 'type': kind, 'required': required, 'no_zero': False,\
+        'format': date_pattern('YYYY-MM-DD') if kind == 'date' else None}
+
+
+def date_pattern(fmt):
+    ''' (string) -> re.Pattern: regular expression of a date format like 'YYYY-MM-DD' '''
+    return re.compile('^' + re.escape(fmt).replace('YYYY', r'\d{4}').replace('MM', r'\d{2}').replace('DD', r'\d{2}') + '$')
+
+
+# compiled once per schema version; checks of all versions by path for the report (same path -> same check)
+SCHEMAS = {version: compile_schema(field_accessors(version)[0]) for version in SCHEMA_VERSIONS}
+SCHEMA_CHECKS = {}
+for checks, _ in SCHEMAS.values():
+    for path, check in checks.items():
+        SCHEMA_CHECKS.setdefault(path, check)
+
+# -------------------------------------------------------------------------------
+
+def validate_chunk(metadata_path, names):
+    '''
+    (string, list) -> dict, dict
+
+    Check given detectors, return counts (json path, problem) -> number of files and examples (json path, problem) -> [names]
+    '''
+    counts, examples = {}, {}
+    for det in names:
+        try:
+            js = loads_json(read_raw(metadata_path, det))
+            probs = validate_document(js, det)
+        except ValueError:
+            probs = [('json', 'bad_format')]
+        for key in probs:
+            counts[key] = counts.get(key, 0) + 1
+            ex_list = examples.setdefault(key, [])
+            if len(ex_list) < N_EXAMPLES:
+                ex_list.append(det)
+
+    return counts, examples
+
+
+def validate_document(js, det=None, tree=None):
+    '''
+    (dict, string, dict) -> list
+
+    Return problems of one detector json as [(json path, problem)], see validate_tree()
+
+    js [dict]: detector metadata
+    det [string]: detector name the 'name' field has to match (not checked if None)
+    tree [dict]: compiled schema tree (default the one of the schema version of js, see SCHEMAS)
+    '''
+    if tree is None:
+        tree = SCHEMAS.get(schema_version(js), SCHEMAS['new'])[1]
+    res = []
+    stack = [(js, tree)]
+    while stack:
+        node, subtree = stack.pop()
+        for key, (children, checks) in subtree.items():
+            present = isinstance(node, dict) and key in node
+            val = node[key] if present else None
+            for check in checks:
+                prob = check_value(check, present, val)
+                if prob is not None:
+                    res.append((check['path'], prob))
+            if children:
+                stack.append((val, children))
+
+    if det is not None and js.get('name', det) != det:
+        res.append(('/'.join(NAME_PATH), 'bad_format'))
+
+    return res
+
+
+def check_value(check, present, val):
+    ''' (dict, bool, value) -> string: problem of one value (see PROBLEMS) or None '''
+    if not present:
+        return 'missing'
+    if val is None:
+        return 'null'
+    kind = check['type']
+    if kind == 'number':
+        if isinstance(val, bool) or not isinstance(val, (int, float)):
+            return 'wrong_type'
+        if check['no_zero'] and val == 0:
+            return 'zero'
+    elif kind == 'string' or kind == 'date':
+        if not isinstance(val, str):
+            return 'wrong_type'
+        if kind == 'date' and not check['format'].match(val):
+            return 'bad_format'
+    elif kind == 'bool' and not isinstance(val, bool):
+        return 'wrong_type'
+
+    return None